@@ -0,0 +1,331 @@
+#
+#   Copyright (c) 2016 Philipp Paulweber
+#   All rights reserved.
+#
+#   Developed by: Philipp Paulweber
+#                 https://github.com/ppaulweber/gilapt
+#
+#   This file is part of gilapt.
+#
+#   gilapt is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   gilapt is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with gilapt. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import sys
+import json
+import time
+import urllib2
+import argparse
+import tempfile
+import resource
+import subprocess
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), ".." ) )
+
+
+# every scenario runs in a fresh process, so its peak memory is its own, it
+# yields once its preparation is done and then the number of operations of
+# its timed part
+_scenarios = []
+
+def scenario( function ) :
+    _scenarios.append( function.__name__ )
+    return function
+# end def
+
+
+def _stats( url, reset = False ) :
+    # returns the number of requests per endpoint the mock has seen
+    if reset :
+        return json.load( urllib2.urlopen( "%s/__reset" % url ) )
+    return json.load( urllib2.urlopen( "%s/__stats" % url ) )
+# end def
+
+def _connect( url, args, lazy = False ) :
+    import gilapt
+    return gilapt.gilapt( url, "token", workers = args.workers, per_page = args.per_page, lazy = lazy, revalidate = args.revalidate )
+# end def
+
+def _path( args, i ) :
+    # path of the generated repo 'i' (see 'mock._state.repo')
+    return "group%d/repo%d" % ( 1 + i % args.groups, i )
+# end def
+
+
+@scenario
+def sync( url, args ) :
+    git = _connect( url, args )
+    yield
+    git.sync()
+    yield len( git.getUsers() ) + len( git.getGroups() ) + len( git.getNamespaces() ) + len( git.getRepos() )
+# end def
+
+@scenario
+def getRepo_cold( url, args ) :
+    git = _connect( url, args )
+    yield
+    assert git.getRepo( _path( args, args.repos ) ) is not None
+    yield 1
+# end def
+
+@scenario
+def getRepo_cold_lazy( url, args ) :
+    git = _connect( url, args, lazy = True )
+    yield
+    assert git.getRepo( _path( args, args.repos ) ) is not None
+    yield 1
+# end def
+
+@scenario
+def refresh( url, args ) :
+    git = _connect( url, args )
+    git.getUsers()
+    git.getRepos()
+    yield
+    git.getUsers( False )
+    git.getRepos( False )
+    yield len( git.getUsers() ) + len( git.getRepos() )
+# end def
+
+@scenario
+def getRepo_warm( url, args ) :
+    git = _connect( url, args )
+    git.getRepos()
+    yield
+    for i in xrange( args.lookups ) :
+        git.getRepo( _path( args, 1 + i % args.repos ) )
+    yield args.lookups
+# end def
+
+@scenario
+def addMember( url, args ) :
+    git = _connect( url, args )
+    git.getUsers()
+    git.getRepos()
+    repopath = _path( args, 2 )
+    git.syncMemberships( [ repopath ] )
+    yield
+    for i in xrange( 1, args.writes + 1 ) :
+        git.addMember( repopath, "user%d@example.org" % i, "developer" )
+    yield args.writes
+# end def
+
+@scenario
+def modBranches( url, args ) :
+    git = _connect( url, args )
+    git.getRepos()
+    repopaths = [ _path( args, 1 + i % args.repos ) for i in xrange( args.writes ) ]
+    yield
+    outcomes = git.modBranches( repopaths, "master", True )
+    assert all( o[ "outcome" ] == "done" for o in outcomes )
+    yield len( outcomes )
+# end def
+
+@scenario
+def dumpRepos( url, args ) :
+    git = _connect( url, args )
+    git.getRepos()
+    yield
+    with open( os.devnull, "w" ) as stream :
+        git.dumpRepos( stream = stream )
+    yield len( git.getRepos() )
+# end def
+
+@scenario
+def addCommit( url, args ) :
+    git = _connect( url, args )
+    git.getRepos()
+    repopath = _path( args, 3 )
+    git.getBranches( repopath )
+    yield
+    actions = \
+    [ { "action" : "create", "file_path" : "bench/file%d.txt" % i, "content" : "content %d\n" % i }
+      for i in xrange( args.files )
+    ]
+    assert git.addCommit( repopath, "master", actions, "bench: bulk write" )
+    yield args.files
+# end def
+
+@scenario
+def addFile( url, args ) :
+    git = _connect( url, args )
+    git.getRepos()
+    repopath = _path( args, 4 )
+    git.getBranches( repopath )
+    yield
+    count = max( 1, args.files // 10 )
+    for i in xrange( count ) :
+        git.addFile( repopath, "master", "bench/single%d.txt" % i, "content %d\n" % i, "bench: single write" )
+    yield count
+# end def
+
+@scenario
+def fileStream( url, args ) :
+    git = _connect( url, args )
+    git.getRepos()
+    repopath = _path( args, 5 )
+    git.getBranches( repopath )
+    path = os.path.join( tempfile.gettempdir(), "gilapt-bench-%d.bin" % os.getpid() )
+    with open( path, "wb" ) as f :
+        for i in xrange( args.file_mb ) :
+            f.write( os.urandom( 1 << 20 ) )
+    yield
+    try :
+        git.addFileStream( repopath, "master", "bench/stream.bin", path, "bench: streamed write" )
+        with open( os.devnull, "wb" ) as stream :
+            git.getFileStream( repopath, "master", "bench/stream.bin", stream )
+    finally :
+        os.unlink( path )
+    yield 2
+# end def
+
+
+def _run( name, url, args ) :
+    # runs one scenario in this process, only the part after its first
+    # 'yield' is timed and only its requests are counted
+    steps = globals()[ name ]( url, args )
+    steps.next()
+
+    _stats( url, reset = True )
+    start = time.time()
+    operations = steps.next()
+    seconds = time.time() - start
+
+    requests = sum( _stats( url ).values() )
+    return \
+    { "scenario"   : name
+    , "seconds"    : seconds
+    , "operations" : operations
+    , "requests"   : requests
+    , "peak_kb"    : resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss
+    }
+# end def
+
+def _table( results, baseline, stream ) :
+    titles = ( "scenario", "seconds", "ops", "ops/s", "requests", "req/op", "peak MB" )
+    if baseline is not None :
+        titles = titles + ( "time vs base", "req vs base" )
+    rows = []
+    for r in results :
+        row = \
+        ( r[ "scenario" ]
+        , "%.3f" % r[ "seconds" ]
+        , "%d" % r[ "operations" ]
+        , "%.1f" % ( r[ "operations" ] / max( r[ "seconds" ], 1e-9 ) )
+        , "%d" % r[ "requests" ]
+        , "%.2f" % ( float( r[ "requests" ] ) / max( r[ "operations" ], 1 ) )
+        , "%.1f" % ( r[ "peak_kb" ] / 1024.0 )
+        )
+        if baseline is not None :
+            base = baseline.get( r[ "scenario" ] )
+            if base is None :
+                row = row + ( "-", "-" )
+            else :
+                row = row + \
+                ( "%.2fx" % ( r[ "seconds" ] / max( base[ "seconds" ], 1e-9 ) )
+                , "%+d" % ( r[ "requests" ] - base[ "requests" ] )
+                )
+        rows.append( row )
+
+    widths = [ max( len( row[ i ] ) for row in [ titles ] + rows ) for i in range( len( titles ) ) ]
+    for row in [ titles ] + rows :
+        stream.write( "  ".join( c.ljust( w ) if i == 0 else c.rjust( w ) for i, ( c, w ) in enumerate( zip( row, widths ) ) ) + "\n" )
+# end def
+
+def main( argv ) :
+    parser = argparse.ArgumentParser( prog = "bench", description = "times gilapt against a local mock of the GitLab API" )
+    parser.add_argument( "--users",      type = int,   default = 10000 )
+    parser.add_argument( "--repos",      type = int,   default = 10000 )
+    parser.add_argument( "--groups",     type = int,   default = 10 )
+    parser.add_argument( "--per-page",   type = int,   default = 100,    help = "page size (default: 100)" )
+    parser.add_argument( "--latency",    type = float, default = 0.0,    help = "seconds added to every request" )
+    parser.add_argument( "--rate-limit", type = int,   default = 0,      help = "requests per second before 429 responses" )
+    parser.add_argument( "--keyset",     action = "store_true", help = "the mock supports keyset pagination" )
+    parser.add_argument( "--workers",    type = int,   default = 8 )
+    parser.add_argument( "--revalidate", type = int,   default = 0,      help = "responses kept for conditional requests (default: 0)" )
+    parser.add_argument( "--lookups",    type = int,   default = 100000, help = "lookups of 'getRepo_warm'" )
+    parser.add_argument( "--writes",     type = int,   default = 200,    help = "members added by 'addMember' and repos of 'modBranches'" )
+    parser.add_argument( "--files",      type = int,   default = 500,    help = "files written by 'addCommit' ('addFile' writes a tenth)" )
+    parser.add_argument( "--file-mb",    type = int,   default = 32,     help = "size of the file 'fileStream' uploads and downloads" )
+    parser.add_argument( "--scenarios",  default = ",".join( _scenarios ), help = "comma separated (default: all)" )
+    parser.add_argument( "--output",     help = "write the results as JSON to this file" )
+    parser.add_argument( "--compare",    help = "compare with the results of an earlier '--output'" )
+    parser.add_argument( "--run",        help = argparse.SUPPRESS )
+    parser.add_argument( "--url",        help = argparse.SUPPRESS )
+    args = parser.parse_args( argv )
+
+    if args.run is not None :
+        sys.stdout.write( json.dumps( _run( args.run, args.url, args ) ) + "\n" )
+        return 0
+
+    names = [ n for n in args.scenarios.split( "," ) if len( n ) > 0 ]
+    for name in names :
+        assert name in _scenarios, "unknown scenario '%s'" % name
+
+    here = os.path.dirname( os.path.abspath( __file__ ) )
+    mock = subprocess.Popen \
+    ( [ sys.executable, os.path.join( here, "mock.py" )
+      , "--users", "%d" % args.users
+      , "--repos", "%d" % args.repos
+      , "--groups", "%d" % args.groups
+      , "--per-page", "%d" % args.per_page
+      , "--latency", "%f" % args.latency
+      , "--rate-limit", "%d" % args.rate_limit
+      ] + ( [ "--keyset" ] if args.keyset else [] )
+    , stdout = subprocess.PIPE
+    )
+    url = mock.stdout.readline().strip()
+
+    results = []
+    try :
+        for name in names :
+            child = subprocess.Popen \
+            ( [ sys.executable, os.path.abspath( __file__ ), "--run", name, "--url", url ] + argv
+            , stdout = subprocess.PIPE
+            )
+            output = child.communicate()[ 0 ]
+            if child.returncode != 0 :
+                sys.stderr.write( "bench: error: scenario '%s' failed\n" % name )
+                continue
+            results.append( json.loads( output.strip().splitlines()[ -1 ] ) )
+    finally :
+        mock.terminate()
+
+    config = dict \
+    ( ( k, getattr( args, k ) )
+      for k in ( "users", "repos", "groups", "per_page", "latency", "rate_limit", "keyset", "workers", "revalidate", "lookups", "writes", "files", "file_mb" )
+    )
+
+    baseline = None
+    if args.compare is not None :
+        with open( args.compare ) as f :
+            previous = json.load( f )
+        if previous[ "config" ] != config :
+            sys.stderr.write( "bench: warning: '%s' was measured with a different configuration\n" % args.compare )
+        baseline = dict( ( r[ "scenario" ], r ) for r in previous[ "results" ] )
+
+    sys.stdout.write( "users=%(users)d repos=%(repos)d per_page=%(per_page)d latency=%(latency)g rate_limit=%(rate_limit)d keyset=%(keyset)s workers=%(workers)d revalidate=%(revalidate)d\n" % config )
+    _table( results, baseline, sys.stdout )
+
+    if args.output is not None :
+        with open( args.output, "w" ) as f :
+            json.dump( { "config" : config, "results" : results }, f, indent = 2, sort_keys = True )
+
+    if len( results ) != len( names ) :
+        return 1
+    return 0
+# end def
+
+if __name__ == "__main__" :
+    sys.exit( main( sys.argv[ 1: ] ) )
@@ -0,0 +1,551 @@
+#
+#   Copyright (c) 2016 Philipp Paulweber
+#   All rights reserved.
+#
+#   Developed by: Philipp Paulweber
+#                 https://github.com/ppaulweber/gilapt
+#
+#   This file is part of gilapt.
+#
+#   gilapt is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   gilapt is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with gilapt. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import re
+import sys
+import json
+import base64
+import hashlib
+import time
+import urllib
+import urlparse
+import argparse
+import threading
+import SocketServer
+import BaseHTTPServer
+
+
+class _state(object):
+    """Generated GitLab instance"""
+
+    def __init__( self, users, repos, groups, per_page, latency, rate_limit, keyset, etags ) :
+        # the initial users, groups, namespaces and repos are generated from
+        # their index on every request, so large instances cost no memory,
+        # only created entities and changes are stored
+        self.users    = users
+        self.repos    = repos
+        self.groups   = groups
+        self.per_page = per_page
+        self.latency  = latency
+        self.keyset   = keyset
+        self.etags    = etags
+
+        self.rate_limit = rate_limit
+        self.window     = int( time.time() )
+        self.used       = 0
+
+        self.lock     = threading.Lock()
+        self.counts   = {}
+        self.created  = { "users" : [], "projects" : [] }
+        self.members  = {} # repo id -> user id -> access level
+        self.branches = {} # repo id -> branch name -> protected
+        self.files    = {} # ( repo id, branch, path ) -> raw content
+    # end def
+
+    def user( self, i ) :
+        if i > self.users :
+            return self.created[ "users" ][ i - self.users - 1 ]
+        return \
+        { "id"         : i
+        , "username"   : "user%d" % i
+        , "email"      : "user%d@example.org" % i
+        , "name"       : "User %d" % i
+        , "state"      : "active"
+        , "created_at" : "2016-01-01T00:00:00Z"
+        }
+    # end def
+
+    def group( self, i ) :
+        return { "id" : i, "path" : "group%d" % i, "name" : "group%d" % i, "description" : "" }
+    # end def
+
+    def namespace( self, i ) :
+        if i <= self.groups :
+            return { "id" : i, "path" : "group%d" % i, "kind" : "group", "owner_id" : None }
+        user = self.user( i - self.groups )
+        return { "id" : i, "path" : user[ "username" ], "kind" : "user", "owner_id" : user[ "id" ] }
+    # end def
+
+    def repo( self, i ) :
+        if i > self.repos :
+            return self.created[ "projects" ][ i - self.repos - 1 ]
+        group = 1 + i % self.groups
+        return \
+        { "id"                  : i
+        , "path"                : "repo%d" % i
+        , "path_with_namespace" : "group%d/repo%d" % ( group, i )
+        , "description"         : ""
+        , "public"              : False
+        , "default_branch"      : "master"
+        , "created_at"          : "2016-01-01T00:00:00Z"
+        , "last_activity_at"    : "2016-01-01T00:00:00Z"
+        , "namespace"           : { "id" : group, "path" : "group%d" % group, "owner_id" : None }
+        }
+    # end def
+
+    def count( self, kind ) :
+        if kind == "users" :
+            return self.users + len( self.created[ "users" ] )
+        elif kind == "projects" :
+            return self.repos + len( self.created[ "projects" ] )
+        elif kind == "groups" :
+            return self.groups
+        else :
+            return self.groups + self.count( "users" )
+    # end def
+
+    def entity( self, kind, i ) :
+        return getattr( self, { "users" : "user", "projects" : "repo", "groups" : "group", "namespaces" : "namespace" }[ kind ] )( i )
+    # end def
+
+    def admit( self ) :
+        # returns the seconds to wait if the rate limit is exceeded
+        if self.rate_limit <= 0 :
+            return 0
+        with self.lock :
+            now = int( time.time() )
+            if now != self.window :
+                self.window = now
+                self.used   = 0
+            self.used = self.used + 1
+            if self.used > self.rate_limit :
+                return 1
+            return 0
+    # end def
+
+# end class
+
+
+def _content( entry ) :
+    # the raw content of a file write (or commit action)
+    if entry.get( "encoding" ) == "base64" :
+        return base64.b64decode( entry.get( "content" ) or "" )
+    content = entry.get( "content" ) or ""
+    if isinstance( content, unicode ) :
+        return content.encode( "utf-8" )
+    return content
+# end def
+
+
+class _handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """GitLab API v3 subset"""
+
+    protocol_version = "HTTP/1.1"
+    wbufsize = 65536
+    disable_nagle_algorithm = True
+
+    def log_message( self, *args ) :
+        pass
+    # end def
+
+    def _send( self, status, body, headers = {} ) :
+        data = json.dumps( body )
+        if status == 200 and self.command == "GET" and self.server.state.etags :
+            # like the 'Rack::ConditionalGet' middleware of GitLab the body is
+            # still built, but only sent if it changed
+            headers = dict( headers, ETag = 'W/"%s"' % hashlib.md5( data ).hexdigest() )
+            if self.headers.get( "If-None-Match" ) == headers[ "ETag" ] :
+                status = 304
+                data   = ""
+        self.send_response( status )
+        self.send_header( "Content-Type", "application/json" )
+        self.send_header( "Content-Length", "%d" % len( data ) )
+        for k, v in headers.items() :
+            self.send_header( k, v )
+        self.end_headers()
+        self.wfile.write( data )
+        self.wfile.flush()
+    # end def
+
+    def _send_raw( self, data ) :
+        self.send_response( 200 )
+        self.send_header( "Content-Type", "application/octet-stream" )
+        self.send_header( "Content-Length", "%d" % len( data ) )
+        self.end_headers()
+        self.wfile.write( data )
+        self.wfile.flush()
+    # end def
+
+    def _body( self ) :
+        # the body is always consumed, otherwise it would be read as the next
+        # request of the kept alive connection
+        if self.headers.get( "Transfer-Encoding", "" ) == "chunked" :
+            chunks = []
+            while True :
+                length = int( self.rfile.readline().split( ";" )[ 0 ], 16 )
+                chunks.append( self.rfile.read( length ) )
+                self.rfile.readline()
+                if length == 0 :
+                    break
+            raw = "".join( chunks )
+        else :
+            length = int( self.headers.get( "Content-Length" ) or 0 )
+            raw = self.rfile.read( length ) if length > 0 else ""
+        if self.headers.get( "Content-Type", "" ).startswith( "application/json" ) :
+            return json.loads( raw )
+        return dict( urlparse.parse_qsl( raw ) )
+    # end def
+
+    def _page( self, kind, query, match = None ) :
+        state = self.server.state
+        page  = max( 1, int( query.get( "page", 1 ) ) )
+        per   = min( state.per_page, max( 1, int( query.get( "per_page", 20 ) ) ) )
+        total = state.count( kind )
+
+        if state.keyset and query.get( "pagination" ) == "keyset" and match is None :
+            return self._keyset( kind, query, per, total )
+
+        if match is not None :
+            ids = [ i for i in xrange( 1, total + 1 ) if match( state.entity( kind, i ) ) ]
+        else :
+            ids = None
+        size = total if ids is None else len( ids )
+
+        items = []
+        for n in xrange( ( page - 1 ) * per, min( page * per, size ) ) :
+            if query.get( "sort" ) == "desc" :
+                n = size - 1 - n
+            items.append( state.entity( kind, n + 1 if ids is None else ids[ n ] ) )
+
+        pages = max( 1, ( size + per - 1 ) // per )
+        headers = \
+        { "X-Page"      : "%d" % page
+        , "X-Per-Page"  : "%d" % per
+        , "X-Next-Page" : "%d" % ( page + 1 ) if page < pages else ""
+        }
+        # like GitLab the totals are not counted above 10000 entries
+        if size <= 10000 :
+            headers.update( { "X-Total" : "%d" % size, "X-Total-Pages" : "%d" % pages } )
+        self._send( 200, items, headers )
+    # end def
+
+    def _list( self, items, query ) :
+        # offset pages of a short list, e.g. the members of a repo
+        state = self.server.state
+        page  = max( 1, int( query.get( "page", 1 ) ) )
+        per   = min( state.per_page, max( 1, int( query.get( "per_page", 20 ) ) ) )
+        pages = max( 1, ( len( items ) + per - 1 ) // per )
+        self._send \
+        ( 200
+        , items[ ( page - 1 ) * per : page * per ]
+        , { "X-Page"        : "%d" % page
+          , "X-Per-Page"    : "%d" % per
+          , "X-Total"       : "%d" % len( items )
+          , "X-Total-Pages" : "%d" % pages
+          , "X-Next-Page"   : "%d" % ( page + 1 ) if page < pages else ""
+          }
+        )
+    # end def
+
+    def _keyset( self, kind, query, per, total ) :
+        # pages by id, every page links to the next one through a cursor
+        # and (unlike offset pages) carries no page or total headers
+        state = self.server.state
+        if query.get( "sort" ) == "desc" :
+            before = int( query.get( "id_before", total + 1 ) )
+            ids = range( before - 1, max( 0, before - 1 - per ), -1 )
+            cursor = "id_before"
+        else :
+            after = int( query.get( "id_after", 0 ) )
+            ids = range( after + 1, min( total, after + per ) + 1 )
+            cursor = "id_after"
+
+        if cursor == "id_before" :
+            more = len( ids ) > 0 and ids[ -1 ] > 1
+        else :
+            more = len( ids ) > 0 and ids[ -1 ] < total
+
+        headers = {}
+        if more :
+            query = dict( query, **{ cursor : "%d" % ids[ -1 ] } )
+            query.pop( "page", None )
+            headers[ "Link" ] = '<http://%s:%d%s?%s>; rel="next"' \
+            % ( self.server.server_address + ( self.path.partition( "?" )[ 0 ], urllib.urlencode( query ) ) )
+        self._send( 200, [ state.entity( kind, i ) for i in ids ], headers )
+    # end def
+
+    def _repo_id( self, key ) :
+        state = self.server.state
+        if key.isdigit() :
+            return int( key ) if 0 < int( key ) <= state.count( "projects" ) else None
+        namespace, separator, path = key.partition( "/" )
+        if path.startswith( "repo" ) and path[ 4 : ].isdigit() :
+            i = int( path[ 4 : ] )
+            if i <= state.repos and state.repo( i )[ "path_with_namespace" ] == key :
+                return i
+        for r in state.created[ "projects" ] :
+            if r[ "path_with_namespace" ] == key :
+                return r[ "id" ]
+        return None
+    # end def
+
+    def _route( self, method ) :
+        state = self.server.state
+        url   = urlparse.urlparse( self.path )
+        query = dict( urlparse.parse_qsl( url.query ) )
+        parts = [ urllib.unquote( p ) for p in url.path.split( "/" )[ 3 : ] if len( p ) > 0 ]
+        body  = self._body() if method != "GET" else {}
+
+        if url.path == "/__stats" :
+            with state.lock :
+                return self._send( 200, state.counts )
+        if url.path == "/__reset" :
+            with state.lock :
+                state.counts = {}
+            return self._send( 200, {} )
+
+        endpoint = "%s /%s" % ( method, "/".join( ":id" if p.isdigit() or "/" in p else p for p in parts[ : 4 ] ) )
+        with state.lock :
+            state.counts[ endpoint ] = state.counts.get( endpoint, 0 ) + 1
+
+        if state.latency > 0 :
+            time.sleep( state.latency )
+
+        wait = state.admit()
+        if wait > 0 :
+            return self._send \
+            ( 429
+            , { "message" : "429 Too Many Requests" }
+            , { "Retry-After" : "%d" % wait, "RateLimit-Remaining" : "0", "RateLimit-Reset" : "%d" % ( state.window + 1 ) }
+            )
+
+        kind = parts[ 0 ] if len( parts ) > 0 else ""
+
+        if method == "GET" and len( parts ) == 1 and kind in ( "users", "groups", "namespaces", "projects" ) :
+            search = query.get( "search", query.get( "username" ) )
+            if search is None :
+                return self._page( kind, query )
+            key = { "users" : "username", "namespaces" : "path" }.get( kind, "path" )
+            return self._page( kind, query, lambda e : search in e[ key ] or search in e.get( "email", "" ) )
+
+        if method == "GET" and len( parts ) == 2 and kind in ( "users", "groups" ) :
+            i = int( parts[ 1 ] ) if parts[ 1 ].isdigit() else None
+            if kind == "groups" and parts[ 1 ].startswith( "group" ) and parts[ 1 ][ 5 : ].isdigit() :
+                i = int( parts[ 1 ][ 5 : ] )
+            if i is not None and 0 < i <= state.count( kind ) :
+                return self._send( 200, state.entity( kind, i ) )
+            return self._send( 404, { "message" : "404 Not found" } )
+
+        if method == "POST" and parts == [ "users" ] :
+            with state.lock :
+                for u in state.created[ "users" ] :
+                    if u[ "username" ] == body[ "username" ] or u[ "email" ] == body[ "email" ] :
+                        return self._send( 409, { "message" : "Username or email has already been taken" } )
+                for key, suffix in ( ( "username", "" ), ( "email", "@example.org" ) ) :
+                    name = body[ key ]
+                    if name.startswith( "user" ) and name.endswith( suffix ) and name[ 4 : len( name ) - len( suffix ) ].isdigit() \
+                    and 0 < int( name[ 4 : len( name ) - len( suffix ) ] ) <= state.users :
+                        return self._send( 409, { "message" : "Username or email has already been taken" } )
+                user = dict( state.user( 1 ), id = state.count( "users" ) + 1 )
+                user.update( username = body[ "username" ], email = body[ "email" ], name = body[ "name" ] )
+                state.created[ "users" ].append( user )
+            return self._send( 201, user )
+
+        if method == "POST" and parts == [ "projects" ] :
+            with state.lock :
+                namespace = state.namespace( int( body[ "namespace_id" ] ) )
+                # like GitLab the path defaults to the parameterized name
+                path = body.get( "path" ) or re.sub( r"-{2,}", "-", re.sub( r"[^a-z0-9\-_]+", "-", body[ "name" ].lower() ) ).strip( "-" )
+                repo = dict( state.repo( 1 ), id = state.count( "projects" ) + 1, name = body[ "name" ], path = path )
+                repo.update \
+                ( path_with_namespace = "%s/%s" % ( namespace[ "path" ], path )
+                , namespace = { "id" : namespace[ "id" ], "path" : namespace[ "path" ], "owner_id" : namespace[ "owner_id" ] }
+                , default_branch = None
+                )
+                state.created[ "projects" ].append( repo )
+            return self._send( 201, repo )
+
+        if kind != "projects" or len( parts ) < 2 :
+            return self._send( 404, { "message" : "404 Not found" } )
+
+        rid = self._repo_id( parts[ 1 ] )
+        if rid is None :
+            return self._send( 404, { "message" : "404 Project Not Found" } )
+
+        if len( parts ) == 2 and method == "GET" :
+            return self._send( 200, state.repo( rid ) )
+
+        if parts[ 2 ] == "members" :
+            with state.lock :
+                members = state.members.setdefault( rid, {} )
+                if method == "GET" :
+                    items = [ dict( state.user( u ), access_level = l ) for u, l in sorted( members.items() ) ]
+                    return self._list( items, query )
+                if method == "POST" :
+                    uid = int( body[ "user_id" ] )
+                    if uid in members :
+                        return self._send( 409, { "message" : "Member already exists" } )
+                    members[ uid ] = int( body[ "access_level" ] )
+                    return self._send( 201, dict( state.user( uid ), access_level = members[ uid ] ) )
+                uid = int( parts[ 3 ] )
+                if not ( uid in members ) :
+                    return self._send( 404, { "message" : "404 Not found" } )
+                if method == "PUT" :
+                    members[ uid ] = int( body[ "access_level" ] )
+                    return self._send( 200, dict( state.user( uid ), access_level = members[ uid ] ) )
+                del members[ uid ]
+                return self._send( 200, {} )
+
+        if parts[ 2 : 4 ] == [ "repository", "branches" ] :
+            with state.lock :
+                if not ( rid in state.branches ) :
+                    state.branches[ rid ] = { "master" : False } if state.repo( rid )[ "default_branch" ] else {}
+                branches = state.branches[ rid ]
+                def branch( name ) :
+                    return { "name" : name, "protected" : branches[ name ], "commit" : { "id" : "0" * 40 } }
+                if method == "GET" and len( parts ) == 4 :
+                    # like in API v3 the branches are not paginated
+                    return self._send( 200, [ branch( b ) for b in sorted( branches ) ] )
+                if method == "GET" :
+                    if parts[ 4 ] in branches :
+                        return self._send( 200, branch( parts[ 4 ] ) )
+                    return self._send( 404, { "message" : "404 Branch Not Found" } )
+                if method == "POST" :
+                    if body[ "branch_name" ] in branches :
+                        return self._send( 400, { "message" : "Branch already exists" } )
+                    if not ( body[ "ref" ] in branches ) :
+                        return self._send( 400, { "message" : "Invalid reference name" } )
+                    branches[ body[ "branch_name" ] ] = False
+                    return self._send( 201, branch( body[ "branch_name" ] ) )
+                if method == "PUT" and parts[ 4 ] in branches :
+                    branches[ parts[ 4 ] ] = parts[ 5 ] == "protect"
+                    return self._send( 200, branch( parts[ 4 ] ) )
+            return self._send( 404, { "message" : "404 Branch Not Found" } )
+
+        if parts[ 2 : 4 ] == [ "repository", "tree" ] :
+            ref  = query.get( "ref_name" )
+            path = query.get( "path", "" )
+            with state.lock :
+                items = \
+                [ { "name" : p.rpartition( "/" )[ 2 ], "type" : "blob", "path" : p }
+                  for ( r, b, p ) in state.files
+                  if r == rid and b == ref and p.rpartition( "/" )[ 0 ] == path
+                ]
+            return self._send( 200, items )
+
+        if parts[ 2 : 4 ] == [ "repository", "blobs" ] and len( parts ) == 5 :
+            key = ( rid, parts[ 4 ], query.get( "filepath" ) )
+            with state.lock :
+                if key in state.files :
+                    return self._send_raw( state.files[ key ] )
+            return self._send( 404, { "message" : "404 File Not Found" } )
+
+        if parts[ 2 : 4 ] == [ "repository", "files" ] :
+            if method == "GET" :
+                key = ( rid, query.get( "ref" ), query.get( "file_path" ) )
+            else :
+                key = ( rid, body.get( "branch_name" ), body.get( "file_path" ) )
+            with state.lock :
+                if method == "GET" :
+                    if key in state.files :
+                        return self._send( 200, { "file_path" : key[ 2 ], "content" : base64.b64encode( state.files[ key ] ), "encoding" : "base64" } )
+                    return self._send( 404, { "message" : "404 File Not Found" } )
+                if method == "POST" and key in state.files :
+                    return self._send( 400, { "message" : "A file with this name already exists" } )
+                if method == "DELETE" :
+                    state.files.pop( key, None )
+                    return self._send( 200, { "file_path" : key[ 2 ] } )
+                state.files[ key ] = _content( body )
+                return self._send( 201 if method == "POST" else 200, { "file_path" : key[ 2 ] } )
+
+        if parts[ 2 : 4 ] == [ "repository", "commits" ] and method == "POST" :
+            with state.lock :
+                for action in body[ "actions" ] :
+                    key = ( rid, body[ "branch_name" ], action[ "file_path" ] )
+                    if action[ "action" ] == "delete" :
+                        state.files.pop( key, None )
+                    else :
+                        state.files[ key ] = _content( action )
+            return self._send( 201, { "id" : "0" * 40 } )
+
+        if parts[ 2 ] in ( "share", "milestones" ) and method == "POST" :
+            return self._send( 201, dict( body, id = 1 ) )
+
+        return self._send( 404, { "message" : "404 Not found" } )
+    # end def
+
+    def do_GET( self ) :
+        self._route( "GET" )
+    # end def
+
+    def do_POST( self ) :
+        self._route( "POST" )
+    # end def
+
+    def do_PUT( self ) :
+        self._route( "PUT" )
+    # end def
+
+    def do_DELETE( self ) :
+        self._route( "DELETE" )
+    # end def
+
+# end class
+
+
+class _server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Threaded mock server"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+# end class
+
+
+def start( users = 10000, repos = 10000, groups = 10, per_page = 100, latency = 0.0, rate_limit = 0, keyset = False, etags = True, port = 0 ) :
+    # starts the mock in a background thread and returns the server and its
+    # URL (which is used as the GitLab host)
+    server = _server( ( "127.0.0.1", port ), _handler )
+    server.state = _state( users, repos, groups, per_page, latency, rate_limit, keyset, etags )
+    thread = threading.Thread( target = server.serve_forever )
+    thread.daemon = True
+    thread.start()
+    return server, "http://127.0.0.1:%d" % server.server_address[ 1 ]
+# end def
+
+def main( argv ) :
+    parser = argparse.ArgumentParser( prog = "mock", description = "local mock of the GitLab API v3" )
+    parser.add_argument( "--users",      type = int,   default = 10000 )
+    parser.add_argument( "--repos",      type = int,   default = 10000 )
+    parser.add_argument( "--groups",     type = int,   default = 10 )
+    parser.add_argument( "--per-page",   type = int,   default = 100, help = "largest page size (default: 100)" )
+    parser.add_argument( "--latency",    type = float, default = 0.0, help = "seconds added to every request" )
+    parser.add_argument( "--rate-limit", type = int,   default = 0,   help = "requests per second before 429 responses" )
+    parser.add_argument( "--keyset",     action = "store_true", help = "support keyset pagination" )
+    parser.add_argument( "--no-etags",   action = "store_true", help = "send no 'ETag' headers" )
+    parser.add_argument( "--port",       type = int,   default = 0 )
+    args = parser.parse_args( argv )
+
+    server, url = start( args.users, args.repos, args.groups, args.per_page, args.latency, args.rate_limit, args.keyset, not args.no_etags, args.port )
+    sys.stdout.write( "%s\n" % url )
+    sys.stdout.flush()
+    try :
+        while True :
+            time.sleep( 3600 )
+    except KeyboardInterrupt :
+        pass
+    return 0
+# end def
+
+if __name__ == "__main__" :
+    sys.exit( main( sys.argv[ 1: ] ) )
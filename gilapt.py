@@ -22,7 +22,29 @@
 #   
 
 import os
+import re
 import sys
+import csv
+import base64
+import json
+import hashlib
+import fnmatch
+import time
+import random
+import itertools
+import socket
+import urllib
+import unicodedata
+import calendar
+import marshal
+import sqlite3
+import threading
+import Queue
+import contextlib
+import collections
+import StringIO
+import SocketServer
+import BaseHTTPServer
 
 sys.path.append( os.path.join( os.path.dirname( __file__ ), "lib", "requests" ) )
 sys.path.append( os.path.join( os.path.dirname( __file__ ), "lib", "gitlab" ) )
@@ -30,690 +52,3946 @@ sys.path.append( os.path.join( os.path.dirname( __file__ ), "lib", "org", "py" )
 
 import gitlab
 import libOrg
+import requests
 
 
-class gilapt(object):
-    """GitLab Python Tool"""
+class _scheduler(object):
+    """Rate limit aware admission of API requests"""
     
-    def __init__( self, host, token = "", verify_ssl = True ) :
-        self._git = gitlab.Gitlab( "https://%s" % host, token = token, verify_ssl = verify_ssl )
-        
-        self._users   = None
-        self._id2user = {}
-        
-        self._groups = None
-        self._id2group = {}
-        
-        self._namespaces = None
-        self._id2namespace = {}
-        
-        self._repos  = None
-        self._id2repo = {}
-
-        self._members = None
-# end def
+    INTERACTIVE = 0
+    BULK        = 1
     
-    def sync( self ) :
-        self.getUsers( False )
-        self.getGroups( False )
-        self.getNamespaces( False )
-        self.getRepos( False )
+    def __init__( self, limit ) :
+        # the number of concurrent requests ('window') grows additively up
+        # to 'limit' with every successful request and is halved on every
+        # throttled (429) one, interactive requests are admitted before bulk
+        # ones and nothing is sent while the server asked us to pause
+        self._limit   = limit
+        self._window  = float( limit )
+        self._active  = 0
+        self._waiting = [ 0, 0 ]
+        self._until   = 0.0
+        self._lock    = threading.Condition()
     # end def
     
+    def acquire( self, priority ) :
+        with self._lock :
+            self._waiting[ priority ] = self._waiting[ priority ] + 1
+            while True :
+                now = time.time()
+                if now < self._until :
+                    self._lock.wait( self._until - now )
+                elif self._active >= int( self._window ) \
+                or ( priority == self.BULK and self._waiting[ self.INTERACTIVE ] > 0 ) :
+                    # woken up by 'release', a timeout would poll in Python 2
+                    self._lock.wait()
+                else :
+                    break
+            self._waiting[ priority ] = self._waiting[ priority ] - 1
+            self._active = self._active + 1
+    # end def
     
-    ############################################################################
-    # USER
-    ############################################################################
-    
-    def getUsers( self, cache = True ) :
-        if self._users is None or cache is False :
-            self._users = []
-            c = 1
-            result = None
-            while result is None or len( result ) != 0 :
-                result = self._git.getusers( page=c )
-                c = c + 1  
-                for r in result :
-                    self._users.append( r )
+    def release( self, response ) :
+        with self._lock :
+            self._active = self._active - 1
+            now = time.time()
             
-            self._id2user = {}
-            for u in self._users :
-                self._id2user[ u['id'] ] = u
+            if response is not None and response.status_code == 429 :
+                self._window = max( 1.0, self._window / 2 )
+                retry = response.headers.get( "Retry-After", "" )
+                if retry.isdigit() :
+                    self._until = max( self._until, now + int( retry ) )
+            elif response is not None :
+                self._window = min( float( self._limit ), self._window + 1.0 / self._window )
             
-        return self._users
+            if response is not None :
+                remaining = response.headers.get( "RateLimit-Remaining", "" )
+                reset     = response.headers.get( "RateLimit-Reset", "" )
+                if remaining.isdigit() and reset.isdigit() :
+                    if int( remaining ) == 0 :
+                        self._until = max( self._until, float( reset ) )
+                    elif int( remaining ) < self._window :
+                        self._window = max( 1.0, float( remaining ) )
+            
+            self._lock.notify_all()
     # end def
     
-    def getUser( self, username_or_email, cache = True ) :
-        result = self.getUsers( cache )
+# end class
 
-        users = []
-        for r in result :
-            if username_or_email in r['username'] \
-            or username_or_email in r['email'] :
-                users.append( r )
-        
-        if len( users ) == 0 or len( users ) > 1 :
-            return None
-        else :
-            return users[ 0 ]
+
+class _metrics(object):
+    """Request and cache instrumentation"""
+    
+    # upper bounds (in seconds) of the latency histogram buckets
+    BUCKETS = ( 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0 )
+    
+    # placeholders of the path segments following these ones
+    PLACEHOLDERS = \
+    { "projects" : ":id"
+    , "users"    : ":id"
+    , "groups"   : ":id"
+    , "branches" : ":branch"
+    , "blobs"    : ":sha"
+    }
+    
+    def __init__( self ) :
+        self._lock  = threading.Lock()
+        self._local = threading.local()
+        self.reset()
     # end def
-        
-    def getUserID( self, username_or_email, cache = True ) :
-        result = self.getUser( username_or_email, cache )
-        assert result is not None, "user does not exist!"
-        return result['id']
+    
+    def reset( self ) :
+        with self._lock :
+            self._requests  = {} # endpoint -> status -> count
+            self._latencies = {} # endpoint -> bucket counts, +Inf count and sum
+            self._callers   = {} # public method -> endpoint -> count
+            self._caches    = {} # cache -> [ hits, misses ]
     # end def
     
-    def _get_user_by_id( self, user_id, cache = True ) : 
-        self.getUsers( cache )
+    def endpoint( self, method, base, url ) :
+        # the method and the path below 'base' of the URL, where ids, paths
+        # and names are replaced by placeholders
+        if url.startswith( base ) :
+            url = url[ len( base ) : ]
         
-        try :
-            return self._id2user[ user_id ]
-        except :
-            return None
+        parts = []
+        for p in url.partition( "?" )[ 0 ].split( "/" ) :
+            if p.isdigit() or "%" in p :
+                p = ":id"
+            elif len( parts ) > 0 and parts[ -1 ] in self.PLACEHOLDERS :
+                p = self.PLACEHOLDERS[ parts[ -1 ] ]
+            parts.append( p )
+        return "%s %s" % ( method, "/".join( parts ) )
     # end def
     
-    def hasUser( self, username_or_email, cache = True ) :
-        result = self.getUser( username_or_email, cache )
+    def caller( self, owner ) :
+        # the outermost public method of 'owner' on the stack of this thread,
+        # worker threads inherit the one of the thread which started them
+        caller = getattr( self._local, "caller", None )
+        if caller is not None :
+            return caller
         
-        if result is None :
-            return False
-        else :
-            return True
+        methods = type( owner ).__dict__
+        frame = sys._getframe( 1 )
+        while frame is not None :
+            name = frame.f_code.co_name
+            if not name.startswith( "_" ) \
+            and getattr( methods.get( name ), "func_code", None ) is frame.f_code \
+            and frame.f_locals.get( "self" ) is owner :
+                caller = name
+            frame = frame.f_back
+        return caller or "-"
     # end def
-
-    def addUser \
-    ( self
-    , fullname, username, password, email
-    , projects_limit = None
-    , can_create_group = None
-    , confirm = None
-    , admin = None
-    , skype = None
-    , linkedin = None
-    , twitter = None
-    , url = None
-    , bio = None
-    , ext = None
-    , eid = None
-    , epr = None
-    ) :        
-        params = {}
-        if projects_limit is not None :
-            params['projects_limit'] = projects_limit # Number of projects user can create
-        else :
-            params['projects_limit'] = 0
-        
-        if can_create_group is not None :
-            params['can_create_group'] = can_create_group # User can create groups - true or false
+    
+    def inherit( self, caller ) :
+        self._local.caller = caller
+    # end def
+    
+    def request( self, owner, method, url, response, seconds ) :
+        endpoint = self.endpoint( method, owner._git.api_url, url )
+        caller   = self.caller( owner )
+        if response is not None :
+            status = "%d" % response.status_code
         else :
-            params['can_create_group'] = "false"
-        
-        if confirm is not None :
-            params['confirm'] = confirm # Require confirmation - true (default) or false
-        if admin is not None :
-            params['admin'] = admin # User is admin - true or false (default)
-        if skype is not None :
-            params['skype'] = skype # Skype Account
-        if linkedin is not None :
-            params['linkedin'] = linkedin # LinkedIn Account
-        if twitter is not None :
-            params['twitter'] = twitter # Twitter Account
-        if url is not None :
-            params['website_url'] = url # Website URL
-        if bio is not None :
-            params['bio'] = bio # User's biography
-        if ext is not None :
-            params['external'] = ext # Flags the user as external - true or false(default)
-        if eid is not None :
-            params['extern_uid'] = eid # External UID
-        if epr is not None :
-            params['provider'] = epr # External Provider Name
+            status = "error"
         
-        result = self._git.createuser( fullname, username, password, email, **params )
-
-        if isinstance( result, dict ) :
-            print "gilapt: internal: user added", result['id'], result['name']
-            self._users.append( result )
-            self._id2user[ result['id'] ] = result
+        bucket = len( self.BUCKETS )
+        for i, bound in enumerate( self.BUCKETS ) :
+            if seconds <= bound :
+                bucket = i
+                break
         
-        return result
+        with self._lock :
+            statuses = self._requests.setdefault( endpoint, {} )
+            statuses[ status ] = statuses.get( status, 0 ) + 1
+            
+            latency = self._latencies.setdefault( endpoint, [ 0 ] * ( len( self.BUCKETS ) + 1 ) + [ 0.0 ] )
+            latency[ bucket ] = latency[ bucket ] + 1
+            latency[ -1 ] = latency[ -1 ] + seconds
+            
+            endpoints = self._callers.setdefault( caller, {} )
+            endpoints[ endpoint ] = endpoints.get( endpoint, 0 ) + 1
     # end def
     
-    def modUser( self, username_or_email, username = None, fullname = None, ext = None ) :
-        uid = self.getUserID( username_or_email )
-        
-        params = {}
-        if username is not None :
-            params['username'] = username
-        if fullname is not None :
-            params['name'] = fullname
-        if ext is not None :
-            if ext is True :
-                params['external'] = "true"
-            elif ext is False :
-                params['external'] = "false"
-        
-        self._git.edituser( uid, **params )
+    def cache( self, name, hit ) :
+        with self._lock :
+            counts = self._caches.setdefault( name, [ 0, 0 ] )
+            if hit :
+                counts[ 0 ] = counts[ 0 ] + 1
+            else :
+                counts[ 1 ] = counts[ 1 ] + 1
     # end def
     
-    def dumpUsers( self, search = "", cache = True, stream = sys.stdout, seperator = ", ", startOfLine = "", endOfLine = "\n" ) :
-        result = []
+    def snapshot( self ) :
+        # returns a copy of all counters as plain dicts, the histogram
+        # buckets are cumulative like in Prometheus
+        with self._lock :
+            latency = {}
+            for endpoint, counts in self._latencies.items() :
+                buckets = []
+                total = 0
+                for bound, count in zip( [ "%g" % b for b in self.BUCKETS ] + [ "+Inf" ], counts[ : -1 ] ) :
+                    total = total + count
+                    buckets.append( ( bound, total ) )
+                latency[ endpoint ] = { "count" : total, "sum" : counts[ -1 ], "buckets" : buckets }
+            
+            return \
+            { "requests" : dict( ( e, dict( s ) ) for e, s in self._requests.items() )
+            , "latency"  : latency
+            , "callers"  : dict( ( c, dict( e ) ) for c, e in self._callers.items() )
+            , "caches"   : dict( ( n, { "hits" : c[ 0 ], "misses" : c[ 1 ] } ) for n, c in self._caches.items() )
+            }
+    # end def
+    
+    def prometheus( self ) :
+        # returns the counters in the Prometheus text exposition format
+        snapshot = self.snapshot()
+        lines = []
         
-        for u in self.getUsers( cache ) :
-            if len( search ) == 0 \
-            or search in u['username'] \
-            or search in u['email'] :
-                result.append( u )
-
-        result.append( { 'id': "ID", 'username' : "User Name", 'name' : "Full Name", 'email' : "Email" } )
+        def labels( endpoint, **extra ) :
+            method, separator, path = endpoint.partition( " " )
+            pairs = [ ( "method", method ), ( "endpoint", path ) ] + sorted( extra.items() )
+            return ",".join( '%s="%s"' % ( k, v.replace( '"', '\\"' ) ) for k, v in pairs )
+        
+        lines.append( "# TYPE gilapt_requests_total counter" )
+        for endpoint, statuses in sorted( snapshot[ "requests" ].items() ) :
+            for status, count in sorted( statuses.items() ) :
+                lines.append( "gilapt_requests_total{%s} %d" % ( labels( endpoint, status = status ), count ) )
+        
+        lines.append( "# TYPE gilapt_request_duration_seconds histogram" )
+        for endpoint, latency in sorted( snapshot[ "latency" ].items() ) :
+            for bound, count in latency[ "buckets" ] :
+                lines.append( "gilapt_request_duration_seconds_bucket{%s} %d" % ( labels( endpoint, le = bound ), count ) )
+            lines.append( "gilapt_request_duration_seconds_sum{%s} %f" % ( labels( endpoint ), latency[ "sum" ] ) )
+            lines.append( "gilapt_request_duration_seconds_count{%s} %d" % ( labels( endpoint ), latency[ "count" ] ) )
+        
+        lines.append( "# TYPE gilapt_caller_requests_total counter" )
+        for caller, endpoints in sorted( snapshot[ "callers" ].items() ) :
+            for endpoint, count in sorted( endpoints.items() ) :
+                lines.append( "gilapt_caller_requests_total{%s} %d" % ( labels( endpoint, caller = caller ), count ) )
         
-        for r in result[::-1] :
-            stream.write( "%s%s%s%s%s%s%s%s%s" % \
-            ( startOfLine
-            , r['id'], seperator
-            , r['username'], seperator
-            , r['name'], seperator
-            , r['email'], endOfLine
-            ))
+        for kind in ( "hits", "misses" ) :
+            lines.append( "# TYPE gilapt_cache_%s_total counter" % kind )
+            for name, counts in sorted( snapshot[ "caches" ].items() ) :
+                lines.append( 'gilapt_cache_%s_total{cache="%s"} %d' % ( kind, name, counts[ kind ] ) )
+        
+        return "\n".join( lines ) + "\n"
     # end def
+    
+# end class
+
 
+class _record(object):
+    """Compact cache entry"""
     
-    ############################################################################
-    # GROUP
-    ############################################################################
+    # keeps only the fields gilapt reads in slots, all other fields are
+    # fetched once from the API when they are accessed the first time
     
-    def getGroups( self, cache = True ) :
-        if self._groups is None or cache is False :        
-            self._groups = []
-            c = 1
-            result = None
-            while result is None or len( result ) != 0 :
-                result = self._git.getgroups( page=c )
-                c = c + 1  
-                for r in result :
-                    self._groups.append( r )
-
-            self._id2group = {}
-            for g in self._groups :
-                self._id2group[ g['id'] ] = g
-            
-        return self._groups
+    __slots__ = ( "_source", "_full" )
+    _fields   = ()
+    _url      = None
+    
+    def __init__( self, source, entry ) :
+        self._source = source
+        self.update( entry )
     # end def
     
-    def getGroup( self, groupname, cache = True ) :
-        groups = self.getGroups( cache )
-        for g in groups :
-            if g[ "path" ] == groupname :
-                return g
-        return None
+    def update( self, entry ) :
+        for f in self._fields :
+            setattr( self, f, entry.get( f ) )
+        self._full = None
     # end def
-
-    def getGroupID( self, groupname, cache = True ) :
-        result = self.getGroup( groupname, cache )
-        assert result is not None, "group does not exist!"
-        return result['id']
+    
+    def clear( self ) :
+        self._full = None
     # end def
-
-    def _get_group_by_id( self, group_id, cache = True ) : 
-        self.getGroups( cache )
-        
+    
+    def __getitem__( self, key ) :
+        if key in self._fields :
+            return getattr( self, key )
+        if self._full is None :
+            url = "%s/%s" % ( getattr( self._source._git, self._url ), self.id )
+            self._full = self._source._get_one( url )
+            if self._full is None :
+                self._full = {}
+        return self._full[ key ]
+    # end def
+    
+    def get( self, key, default = None ) :
         try :
-            return self._id2group[ group_id ]
-        except :
-            return None
+            return self[ key ]
+        except KeyError :
+            return default
     # end def
     
-    def hasGroup( self, groupname, cache = True ) :
-        result = self.getGroup( groupname, cache )
-        
-        if result is None :
-            return False
-        else :
-            return True
+    def keys( self ) :
+        return list( self._fields )
     # end def
     
-    def dumpGroups( self, search = "", cache = True, stream = sys.stdout, seperator = ", ", startOfLine = "", endOfLine = "\n" ) :
-        result = []
-        result.append( { 'id': "ID", 'path' : "Group Name", 'description' : "Description" } )
-        
-        for g in self.getGroups( cache ) :
-            if len( search ) == 0 or search in g['path'] :
-                result.append( g )
-        
-        for r in result :
-            stream.write( "%s%s%s%s%s%s%s" % \
-            ( startOfLine
-            , r['id'], seperator
-            , r['path'], seperator
-            , r['description'], endOfLine
-            ))
+    def asdict( self ) :
+        return dict( ( f, self[ f ] ) for f in self.keys() )
     # end def
     
-    ############################################################################
-    # NAMESPACES
-    ############################################################################
+# end class
+
+
+class _user_record(_record):
+    __slots__ = ( "id", "username", "email", "name" )
+    _fields   = __slots__
+    _url      = "users_url"
+# end class
+
+
+class _repo_record(_record):
+    __slots__ = \
+    ( "id", "path", "path_with_namespace", "default_branch", "description"
+    , "public", "last_activity_at", "shared_with_groups"
+    , "namespace_id", "namespace_path", "namespace_owner_id"
+    )
+    _fields   = __slots__[ :8 ]
+    _url      = "projects_url"
     
-    def getNamespaces( self, cache = True ) :
-        if self._namespaces is None or cache is False :
-            self._namespaces = []
-            c = 1
-            result = None
-            while result is None or len( result ) != 0 :
-                result = self._git.getnamespaces( page=c )
-                c = c + 1
-                for ns in result :
-                    self._namespaces.append( ns )
-            
-            for ns in self._namespaces :
-                self._id2namespace[ ns['id'] ] = ns
-            
-        return self._namespaces
+    def update( self, entry ) :
+        _record.update( self, entry )
+        # the shares are read by 'planState', 'None' if the listing lacks them
+        shared = entry.get( "shared_with_groups" )
+        if shared is not None :
+            self.shared_with_groups = \
+            [ { "group_id" : g['group_id'], "group_access_level" : g.get( 'group_access_level' ) }
+              for g in shared
+            ]
+        namespace = entry.get( "namespace" ) or {}
+        self.namespace_id       = namespace.get( "id" )
+        self.namespace_path     = namespace.get( "path" )
+        self.namespace_owner_id = namespace.get( "owner_id" )
     # end def
-
-    def getNamespace( self, namespace, cache = True ) :
-        result = self.getNamespaces( cache )
-        for r in result :
-            if r[ "path" ] == namespace :
-                return r
-        return None
+    
+    def __getitem__( self, key ) :
+        if key == "namespace" :
+            return { "id" : self.namespace_id, "path" : self.namespace_path, "owner_id" : self.namespace_owner_id }
+        return _record.__getitem__( self, key )
     # end def
     
-    def hasNamespace( self, namespace, cache = True ) :
-        result = self.getNamespace( namespace, cache )
-
-        if result is None :
-            return False
-        else :
-            return True
+    def keys( self ) :
+        return list( self._fields ) + [ "namespace" ]
     # end def
+    
+# end class
 
-    def dumpNamespaces( self, search = "", cache = True, stream = sys.stdout, seperator = ", ", startOfLine = "", endOfLine = "\n" ) :
-        result = []
-        result.append( { 'id': "ID", 'path' : "Namespace", 'kind' : "Kind" } )
-        
-        for g in self.getNamespaces( cache ) :
-            if len( search ) == 0 or search in g['path'] :
-                result.append( g )
-        
-        for r in result :
-            stream.write( "%s%s%s%s%s%s%s" % \
-            ( startOfLine
-            , r['id'], seperator
-            , r['kind'], seperator
-            , r['path'], endOfLine
-            ))
+
+class _revalidated(object):
+    """Response of a GET request which is answered from the revalidation cache"""
+    
+    # only the validators, the pagination headers and the marshalled body
+    # are kept, every 'json' call returns a new copy of the body
+    
+    __slots__   = ( "headers", "_body" )
+    status_code = 200
+    
+    def __init__( self, headers, body ) :
+        self.headers = requests.structures.CaseInsensitiveDict( headers )
+        self._body   = body
     # end def
     
+    def json( self ) :
+        return marshal.loads( self._body )
+    # end def
     
-    ############################################################################
-    # REPOSITORIES
-    ############################################################################
+    @property
+    def content( self ) :
+        return json.dumps( self.json() )
+    # end def
     
-    def getRepos( self, cache = True ) :
-        if self._repos is None or cache is False :
-            self._repos = []
-            c = 1
-            result = None
-            while result is None or len( result ) != 0 :
-                result = self._git.getprojects( page=c )
-                c = c + 1
-                for project in result :
-                    self._repos.append( project )
-
-            for r in self._repos :
-                self._id2repo[ r['id'] ] = r
-            
-        return self._repos
+# end class
+
+
+class _upload(object):
+    """Request body of a file write whose content is encoded while it is sent"""
+    
+    # the content of the local file is read in chunks and sent base64 encoded
+    # in a JSON body, so its size is known in advance and a retry rewinds it
+    
+    CHUNK = 3 * 16384
+    
+    def __init__( self, fields, path ) :
+        self._prefix = _upload.prefix( fields )
+        self._path   = path
+        self._size   = len( self._prefix ) + 4 * ( ( os.path.getsize( path ) + 2 ) // 3 ) + 2
+        self.seek( 0 )
     # end def
     
-    def getRepo( self, repopath, cache = True ) :
-        repos = self.getRepos( cache )
-        for r in repos :
-            if r[ "path_with_namespace" ] == repopath :
-                return r
-        return None
+    def seek( self, offset ) :
+        assert offset == 0, "only rewinding is supported!"
+        self._parts  = _upload.encode( self._prefix, self._chunks() )
+        self._buffer = ""
     # end def
     
-    def getRepoID( self, repopath, cache = True ) :
-        result = self.getRepo( repopath, cache )
-        assert result is not None, "repo does not exist!"
-        return result['id']
+    def read( self, size = -1 ) :
+        while size < 0 or len( self._buffer ) < size :
+            try :
+                self._buffer += self._parts.next()
+            except StopIteration :
+                break
+        if size < 0 :
+            size = len( self._buffer )
+        data = self._buffer[ : size ]
+        self._buffer = self._buffer[ size : ]
+        return data
     # end def
     
-    def _get_repo_by_id( self, repo_id, cache = True ) : 
-        self.getRepos( cache )
-        
-        try :
-            return self._id2repo[ repo_id ]
-        except :
-            return None
+    def __len__( self ) :
+        return self._size
     # end def
     
-    def hasRepo( self, repopath, cache = True ) :
-        result = self.getRepo( repopath, cache )
-        
-        if result is None :
-            return False
-        else :
-            return True
+    def _chunks( self ) :
+        with open( self._path, "rb" ) as f :
+            while True :
+                data = f.read( _upload.CHUNK )
+                if len( data ) == 0 :
+                    break
+                yield data
     # end def
-
-    def addRepo \
-    ( self
-    , name
-    , namespace
-    , description
-    , public = False
-    , issues = True
-    , snippets = True
-    , merge = True
-    , wiki = True
-    , builds = True
-    ) :
-        params = {}        
-        params['namespace_id'] = self.getNamespace( namespace )['id']
-        params['description']  = description
+    
+    @staticmethod
+    def prefix( fields ) :
+        # the JSON body up to the (open) content string
+        return json.dumps( dict( fields, encoding = "base64" ) )[ : -1 ] + ', "content" : "'
+    # end def
+    
+    @staticmethod
+    def encode( prefix, chunks ) :
+        # yields the JSON body with the base64 encoding of the byte strings
+        # 'chunks', only multiples of 3 bytes are encoded before the end, so
+        # the parts join without padding
+        yield prefix
+        rest = ""
+        for c in chunks :
+            rest += c
+            cut = len( rest ) - len( rest ) % 3
+            if cut > 0 :
+                yield base64.b64encode( rest[ : cut ] )
+                rest = rest[ cut : ]
+        yield base64.b64encode( rest ) + '"}'
+    # end def
+    
+# end class
+
+
+class _hook_handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Receiver of GitLab system hook events"""
+    
+    def log_message( self, *args ) :
+        pass
+    # end def
+    
+    def _reply( self, status ) :
+        self.send_response( status )
+        self.send_header( "Content-Length", "0" )
+        self.end_headers()
+    # end def
+    
+    def do_POST( self ) :
+        # every event is a JSON object, it is applied before the response
+        # is sent, so the sender sees a failure as an error status
+        body = self.rfile.read( int( self.headers.get( "Content-Length" ) or 0 ) )
         
-        if public :
-            params['public'] = "true"
+        token = self.server.token
+        if token is not None and self.headers.get( "X-Gitlab-Token" ) != token :
+            return self._reply( 401 )
+        
+        try :
+            event = json.loads( body )
+        except ValueError :
+            return self._reply( 400 )
+        if not isinstance( event, dict ) :
+            return self._reply( 400 )
+        
+        try :
+            applied = self.server.git.applyHook( event )
+        except ( KeyError, TypeError, ValueError ), e :
+            sys.stderr.write( "gilapt: error: unable to apply hook event '%s': %s\n" % ( event.get( "event_name" ), e ) )
+            return self._reply( 422 )
+        
+        # an event which does not concern the caches is accepted (202)
+        if applied :
+            self._reply( 200 )
         else :
-            params['public'] = "false"
+            self._reply( 202 )
+    # end def
+    
+# end class
 
-        if issues :
-            params['issues_enabled'] = "true"
+
+class _hook_server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+# end class
+
+
+def _plain( value ) :
+    # converts a result into plain JSON values, records become dicts
+    if isinstance( value, _record ) :
+        return value.asdict()
+    if isinstance( value, dict ) :
+        return dict( ( k, _plain( v ) ) for k, v in value.iteritems() )
+    if isinstance( value, ( list, tuple, set, frozenset ) ) :
+        return [ _plain( v ) for v in value ]
+    return value
+# end def
+
+def _native( value ) :
+    # converts the unicode strings of a decoded request into UTF-8 strings
+    if isinstance( value, unicode ) :
+        return value.encode( "utf-8" )
+    if isinstance( value, dict ) :
+        return dict( ( _native( k ), _native( v ) ) for k, v in value.iteritems() )
+    if isinstance( value, list ) :
+        return [ _native( v ) for v in value ]
+    return value
+# end def
+
+
+class _socket_handler(SocketServer.StreamRequestHandler):
+    """Connection of a client of the daemon"""
+    
+    def handle( self ) :
+        # every request is one line with the JSON array
+        # '[ method, args, kwargs ]' (the last two are optional), it is
+        # answered by one line with '[ true, result ]' or
+        # '[ false, exception, message ]'
+        while True :
+            line = self.rfile.readline()
+            if len( line ) == 0 :
+                break
+            if len( line.strip() ) == 0 :
+                continue
+            
+            try :
+                request = _native( json.loads( line ) )
+                assert isinstance( request, list ) and len( request ) > 0, "request is not a list!"
+                method = request[ 0 ]
+                args   = request[ 1 ] if len( request ) > 1 else []
+                kwargs = request[ 2 ] if len( request ) > 2 else {}
+                reply  = json.dumps( [ True, _plain( self.server.git._serve_call( method, args, kwargs ) ) ], separators = ( ",", ":" ) )
+            except Exception, e :
+                reply = json.dumps( [ False, e.__class__.__name__, str( e ) ], separators = ( ",", ":" ) )
+            
+            self.wfile.write( reply + "\n" )
+            self.wfile.flush()
+    # end def
+    
+# end class
+
+
+class _socket_server(SocketServer.ThreadingUnixStreamServer):
+    daemon_threads = True
+    
+    def server_close( self ) :
+        SocketServer.ThreadingUnixStreamServer.server_close( self )
+        if os.path.exists( self.server_address ) :
+            os.unlink( self.server_address )
+    # end def
+    
+# end class
+
+
+class gilapt(object):
+    """GitLab Python Tool"""
+    
+    def __init__ \
+    ( self
+    , host
+    , token = ""
+    , verify_ssl = True
+    , workers = 8
+    , per_page = 100
+    , snapshot = None
+    , snapshot_ttl = 3600
+    , incremental = False
+    , lazy = False
+    , branch_ttl = 300
+    , timeout = 30
+    , retries = 5
+    , backoff = 0.5
+    , pool_size = None
+    , concurrency = None
+    , compact = False
+    , instrument = False
+    , keyset = True
+    , revalidate = 0
+    ) :
+        # the host is reached through HTTPS unless it is given as an URL
+        if not ( "://" in host ) :
+            host = "https://%s" % host
+        self._git = gitlab.Gitlab( host, token = token, verify_ssl = verify_ssl )
+        
+        self._workers  = max( 1, workers )
+        self._per_page = per_page
+        
+        # with 'keyset' enabled the user and repo listings ask the server for
+        # keyset pagination and fall back to offset pagination without it
+        self._keyset = keyset
+        
+        # with 'revalidate' above zero the validators ('ETag' and
+        # 'Last-Modified') and the decoded bodies of the last 'revalidate'
+        # small responses are kept (see '_get'), repeated lookups of the same
+        # URL are conditional requests and an unchanged (304) response is
+        # answered from here
+        self._revalidate = revalidate
+        self._validated  = collections.OrderedDict()
+        self._validated_lock = threading.Lock()
+        
+        # all requests share one session, so connections are kept alive and
+        # reused by all worker threads (responses are gzip encoded by default)
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter \
+        ( pool_connections = 1
+        , pool_maxsize = pool_size if pool_size is not None else self._workers
+        )
+        self._session.mount( "https://", adapter )
+        self._session.mount( "http://", adapter )
+        
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        
+        # all requests of all threads pass the scheduler, which keeps the
+        # request rate below the rate limit of the server
+        if concurrency is None :
+            concurrency = pool_size if pool_size is not None else self._workers
+        self._scheduler = _scheduler( concurrency )
+        self._context   = threading.local()
+        
+        # with 'instrument' enabled all requests and cache lookups are counted
+        # (see 'getMetrics' and 'dumpMetrics')
+        self._metrics = None
+        if instrument :
+            self._metrics = _metrics()
+        
+        # guards the (re)fetching of the lists and every change of the caches
+        # and their indexes against concurrent callers (see 'gilaptAsync' and
+        # 'serveSocket'), all other requests are sent without holding it
+        self._lock = threading.RLock()
+        
+        self._users   = None
+        self._id2user = {}
+        self._username2user = {}
+        self._email2user    = {}
+        self._ngram2users   = {}
+        self._user_searches = {}
+        
+        self._groups = None
+        self._id2group = {}
+        self._path2group = {}
+        
+        self._namespaces = None
+        self._id2namespace = {}
+        self._path2namespace = {}
+        
+        self._repos  = None
+        self._id2repo = {}
+        self._path2repo = {}
+
+        # sparse membership matrix, repo id -> user id -> access level and
+        # user id -> repo id -> access level, a repo has a row once its
+        # members are known, the full member records are only kept for the
+        # repos listed by 'getMembers' until their row changes
+        self._repo2access = {}
+        self._user2access = {}
+        self._members = {}
+        
+        # with 'compact' enabled the cached users and repos are kept as
+        # '_record' objects instead of the full API responses
+        self._records = {}
+        if compact :
+            self._records = { "_users" : _user_record, "_repos" : _repo_record }
+        
+        # repo id -> ( time of the listing, branch name -> branch )
+        self._branches   = {}
+        self._branch_ttl = branch_ttl
+        
+        # with 'incremental' enabled a refresh (cache = False) of an already
+        # fetched user or repo list only downloads the changed entries
+        self._incremental = incremental
+        self._synced      = {}
+        
+        # with 'lazy' enabled single lookups on a cold (not yet fetched) list
+        # cache are resolved by a targeted request instead of the full list
+        self._lazy = lazy
+        
+        self._snapshot     = snapshot
+        self._snapshot_ttl = snapshot_ttl
+        if self._snapshot is not None :
+            self.loadSnapshot()
+# end def
+    
+    def sync( self ) :
+        self.getUsers( False )
+        self.getGroups( False )
+        self.getNamespaces( False )
+        self.getRepos( False )
+        
+        if self._snapshot is not None :
+            self.saveSnapshot()
+    # end def
+    
+    
+    ############################################################################
+    # PAGINATION
+    ############################################################################
+    
+    def _parallel( self, function, arguments ) :
+        # applies 'function' to all 'arguments' on a bounded pool of worker
+        # threads and returns the results in the order of the 'arguments'
+        arguments = list( arguments )
+        if self._workers == 1 or len( arguments ) <= 1 :
+            return [ function( a ) for a in arguments ]
+        
+        results = [ None ] * len( arguments )
+        errors  = []
+        tasks   = Queue.Queue()
+        for task in enumerate( arguments ) :
+            tasks.put( task )
+        
+        if self._metrics is not None :
+            caller = self._metrics.caller( self )
+        bulk = getattr( self._context, "bulk", False )
+        
+        def worker() :
+            if self._metrics is not None :
+                self._metrics.inherit( caller )
+            self._context.bulk = bulk
+            while len( errors ) == 0 :
+                try :
+                    i, a = tasks.get_nowait()
+                except Queue.Empty :
+                    return
+                try :
+                    results[ i ] = function( a )
+                except :
+                    errors.append( sys.exc_info() )
+        
+        threads = []
+        for c in range( min( self._workers, len( arguments ) ) ) :
+            t = threading.Thread( target = worker )
+            t.daemon = True
+            t.start()
+            threads.append( t )
+        for t in threads :
+            t.join()
+        
+        if len( errors ) > 0 :
+            raise errors[ 0 ][ 0 ], errors[ 0 ][ 1 ], errors[ 0 ][ 2 ]
+        return results
+    # end def
+    
+    # the vendored pyapi-gitlab sends every call through the module level
+    # functions of 'requests', therefore gilapt issues its requests itself
+    # and uses 'self._git' only for the URLs and the credentials
+    
+    _retry_status = [ 429, 500, 502, 503, 504 ]
+    
+    @contextlib.contextmanager
+    def _bulk( self ) :
+        # the requests of the calling thread (and of the workers it starts
+        # through '_parallel') are scheduled as bulk requests
+        bulk = getattr( self._context, "bulk", False )
+        self._context.bulk = True
+        try :
+            yield
+        finally :
+            self._context.bulk = bulk
+    # end def
+    
+    def _request( self, method, url, **kwargs ) :
+        # failed requests are retried with an exponential backoff and full
+        # jitter, a 'POST' is only retried if it was surely not processed,
+        # single calls are scheduled before the pages of listings and the
+        # requests of bulk operations (see '_bulk')
+        if kwargs.pop( "bulk", False ) or getattr( self._context, "bulk", False ) :
+            priority = _scheduler.BULK
         else :
-            params['issues_enabled'] = "false"
+            priority = _scheduler.INTERACTIVE
+        
+        headers = dict( getattr( self._git, "headers", {} ) )
+        headers.update( kwargs.pop( "headers", {} ) )
+        
+        # a streamed body is rewound for a retry, an iterator can not be
+        # rewound and is sent only once
+        body   = kwargs.get( "data" )
+        rewind = hasattr( body, "seek" )
+        once   = hasattr( body, "next" ) and not rewind
+        
+        attempt = 0
+        while True :
+            result = None
+            error  = None
+            if attempt > 0 and rewind :
+                body.seek( 0 )
+            self._scheduler.acquire( priority )
+            start = time.time()
+            try :
+                result = self._session.request \
+                ( method
+                , url
+                , headers = headers
+                , verify  = self._git.verify_ssl
+                , timeout = self._timeout
+                , **kwargs
+                )
+                retry = result.status_code == 429 \
+                or ( result.status_code in self._retry_status and method != "POST" )
+            except requests.exceptions.ConnectionError, e :
+                # an aborted connection may have delivered the request, only
+                # a failed connect surely did not
+                error = sys.exc_info()
+                retry = method != "POST" or self._not_sent( e )
+            except requests.exceptions.Timeout :
+                error = sys.exc_info()
+                retry = method != "POST"
+            finally :
+                self._scheduler.release( result )
+                if self._metrics is not None :
+                    self._metrics.request( self, method, url, result, time.time() - start )
             
-        if snippets :
-            params['snippets_enabled'] = "true"
+            if not retry or once or attempt >= self._retries :
+                if error is not None :
+                    raise error[ 0 ], error[ 1 ], error[ 2 ]
+                return result
+            
+            # a 'Retry-After' pause is enforced for all threads by the scheduler
+            time.sleep( random.uniform( 0, self._backoff * 2 ** attempt ) )
+            attempt = attempt + 1
+    # end def
+    
+    def _not_sent( self, error ) :
+        # tells whether a request failed while connecting to the server
+        if isinstance( error, requests.exceptions.ConnectTimeout ) :
+            return True
+        reason = getattr( error.args[ 0 ] if len( error.args ) > 0 else None, "reason", None )
+        return isinstance( reason, requests.packages.urllib3.exceptions.NewConnectionError )
+    # end def
+    
+    def _call( self, method, url, status, **kwargs ) :
+        # returns the decoded response of the request (or 'True' if it has
+        # no content) if it has the expected 'status', 'False' otherwise
+        if method == "GET" and kwargs.keys() in ( [], [ "params" ] ) :
+            result = self._get( url, kwargs.get( "params" ) )
         else :
-            params['snippets_enabled'] = "false"
-
-        if merge :
-            params['merge_requests_enabled'] = "true"
+            result = self._request( method, url, **kwargs )
+        if result.status_code != status :
+            return False
+        if len( result.content ) == 0 :
+            return True
+        return result.json()
+    # end def
+    
+    # the headers of a response which are kept with its body, file contents
+    # are never kept and neither are bodies above '_revalidate_size' bytes
+    _revalidate_headers = \
+    ( "ETag", "Last-Modified", "Link"
+    , "X-Page", "X-Next-Page", "X-Per-Page", "X-Total", "X-Total-Pages"
+    )
+    _revalidate_size = 65536
+    _revalidate_skip = ( "/repository/files", "/repository/blobs/" )
+    
+    def _get( self, url, params = None, bulk = False ) :
+        if self._revalidate <= 0 or any( s in url for s in self._revalidate_skip ) :
+            return self._request( "GET", url, params = params, bulk = bulk )
+        
+        key = ( url, tuple( sorted( ( params or {} ).items() ) ) )
+        with self._validated_lock :
+            known = self._validated.get( key )
+        
+        headers = {}
+        if known is not None :
+            if "ETag" in known.headers :
+                headers['If-None-Match'] = known.headers['ETag']
+            if "Last-Modified" in known.headers :
+                headers['If-Modified-Since'] = known.headers['Last-Modified']
+        
+        result = self._request( "GET", url, params = params, headers = headers, bulk = bulk )
+        
+        if result.status_code == 304 and known is not None :
+            result = known
+        elif result.status_code != 200 \
+        or not ( "ETag" in result.headers or "Last-Modified" in result.headers ) \
+        or len( result.content ) == 0 \
+        or len( result.content ) > self._revalidate_size :
+            return result
         else :
-            params['merge_requests_enabled'] = "false"
-
-        if wiki :
-            params['wiki_enabled'] = "true"
+            kept = dict( ( h, result.headers[ h ] ) for h in self._revalidate_headers if h in result.headers )
+            known = _revalidated( kept, marshal.dumps( result.json() ) )
+        
+        with self._validated_lock :
+            self._validated.pop( key, None )
+            self._validated[ key ] = known
+            while len( self._validated ) > self._revalidate :
+                self._validated.popitem( last = False )
+        return result
+    # end def
+    
+    def _get_one( self, url, params = None ) :
+        # returns a single entity or 'None' if it does not exist
+        result = self._get( url, params )
+        if result.status_code == 404 :
+            return None
+        assert result.status_code == 200, "unable to fetch '%s'!" % url
+        return result.json()
+    # end def
+    
+    def _get_page( self, url, page, params = None, per_page = None, bulk = True ) :
+        data = {}
+        if params is not None :
+            data.update( params )
+        data['page']     = page
+        data['per_page'] = per_page if per_page is not None else self._per_page
+        
+        result = self._get( url, data, bulk )
+        assert result.status_code == 200, "unable to fetch page %s of '%s'!" % ( page, url )
+        return ( result.json(), result.headers )
+    # end def
+    
+    def _next_link( self, headers ) :
+        # returns the URL of the next page given by the 'Link' header
+        for link in requests.utils.parse_header_links( headers.get( "Link", "" ) ) :
+            if link.get( "rel" ) == "next" :
+                return link['url']
+        return None
+    # end def
+    
+    def _iter_pages( self, url, params = None, window = None, convert = None, bulk = True ) :
+        # yields the pages of a listing in order, the first page tells us
+        # through the 'X-Total-Pages' header how many pages are left, they
+        # are fetched concurrently at once or 'window' pages at a time, with
+        # 'convert' every page is converted by the worker which fetched it,
+        # so a listing is never held in full before the conversion, a lookup
+        # on behalf of a single call passes 'bulk' False (see '_bulk')
+        if convert is None :
+            convert = lambda page : page
+        
+        keyset = self._keyset and url in ( self._git.users_url, self._git.projects_url )
+        if keyset :
+            data = { "pagination" : "keyset", "order_by" : "id", "sort" : "asc", "page" : 1, "per_page" : self._per_page }
+            data.update( params or {} )
+            result = self._get( url, data, bulk )
+            if result.status_code == 200 :
+                first, headers = result.json(), result.headers
+            else :
+                # the server rejects keyset pagination (e.g. 405 for this
+                # listing or an old version), offset pagination from now on
+                self._keyset = keyset = False
+        
+        if not keyset :
+            first, headers = self._get_page( url, 1, params, bulk = bulk )
+        if len( first ) == 0 :
+            return
+        yield convert( first )
+        
+        link = self._next_link( headers )
+        if keyset and link is not None and not ( "X-Page" in headers ) :
+            # the server walks the listing by a cursor, every page links to
+            # the next one, so the pages are fetched one after the other, but
+            # each costs the same and entries are neither skipped nor repeated
+            while link is not None :
+                result = self._get( link, bulk = bulk )
+                assert result.status_code == 200, "unable to fetch '%s'!" % link
+                page = result.json()
+                if len( page ) == 0 :
+                    return
+                yield convert( page )
+                link = self._next_link( result.headers )
+            return
+        
+        # the server may cap the page size, a shorter page is the last one
+        size = headers.get( "X-Per-Page", "" )
+        size = int( size ) if size.isdigit() else self._per_page
+        if len( first ) < size :
+            return
+        
+        if not ( "X-Page" in headers or "X-Next-Page" in headers or "X-Total-Pages" in headers or "Link" in headers ) :
+            # the listing is not paginated at all (e.g. the branches in v3)
+            return
+        if headers.get( "X-Next-Page", None ) == "" :
+            return
+        
+        fetch = lambda page : convert( self._get_page( url, page, params, bulk = bulk )[ 0 ] )
+        
+        total = headers.get( "X-Total-Pages", "" )
+        if total.isdigit() :
+            if window is None :
+                window = max( 1, int( total ) - 1 )
+            for c in range( 2, int( total ) + 1, window ) :
+                for page in self._parallel( fetch, range( c, min( c + window, int( total ) + 1 ) ) ) :
+                    yield page
+            return
+        
+        # the server does not report the total (e.g. too many entries),
+        # therefore probe ahead one window of pages at a time until an
+        # empty page shows up
+        if window is None :
+            window = self._workers
+        c = 2
+        while True :
+            pages = self._parallel( fetch, range( c, c + window ) )
+            c = c + window
+            for page in pages :
+                if len( page ) == 0 :
+                    return
+                yield page
+                if len( page ) < size :
+                    return
+    # end def
+    
+    def _get_pages( self, url, params = None, name = None, bulk = True ) :
+        # with 'name' of a list cache the entries are made compact page by page
+        result = []
+        for page in self._iter_pages( url, params, convert = lambda page : self._compact( name, page ), bulk = bulk ) :
+            result.extend( page )
+        return result
+    # end def
+    
+    def _compact( self, name, entries ) :
+        record = self._records.get( name )
+        if record is None :
+            return entries
+        return [ record( self, e ) for e in entries ]
+    # end def
+    
+    def _get_delta( self, url, params, key, since ) :
+        # walks a listing which is sorted descending by 'key' and returns all
+        # entries until the first one which is older than 'since'
+        result = []
+        c = 1
+        while True :
+            page = self._get_page( url, c, params )[ 0 ]
+            c = c + 1
+            if len( page ) == 0 :
+                return result
+            for e in page :
+                if key( e ) < since :
+                    return result
+                result.append( e )
+    # end def
+    
+    def _merge( self, name, entries, cache, index ) :
+        # known entries are updated in place, so references to them stay valid
+        for e in entries :
+            if e['id'] in index :
+                index[ e['id'] ].clear()
+                index[ e['id'] ].update( e )
+            else :
+                e = self._compact( name, [ e ] )[ 0 ]
+                cache.append( e )
+                index[ e['id'] ] = e
+    # end def
+    
+    def _reconcile( self, name, url, params, cache, index ) :
+        # a single request tells the number of entries on the server, if it
+        # matches the cache nothing was deleted, GitLab omits this number
+        # above 10000 entries, then (and on a mismatch) the listing is walked
+        # in id order, every cached id up to the last id of a page which is
+        # not on it was deleted, the entries of each page are merged (so
+        # changed ones are updated) and only the ids of one page are held
+        total = self._get_page( url, 1, params, per_page = 1 )[ 1 ].get( "X-Total", "" )
+        if total.isdigit() and int( total ) == len( cache ) :
+            return
+        
+        data = { "order_by" : "id", "sort" : "asc" }
+        data.update( params )
+        
+        known   = sorted( index.keys() )
+        deleted = set()
+        k = 0
+        for page in self._iter_pages( url, data ) :
+            self._merge( name, page, cache, index )
+            ids  = set( e['id'] for e in page )
+            last = max( ids )
+            while k < len( known ) and known[ k ] <= last :
+                if not ( known[ k ] in ids ) :
+                    deleted.add( known[ k ] )
+                k = k + 1
+        deleted.update( known[ k : ] )
+        
+        if len( deleted ) > 0 :
+            cache[:] = [ e for e in cache if not ( e['id'] in deleted ) ]
+            for i in deleted :
+                del index[ i ]
+    # end def
+    
+    def _timestamp( self, value ) :
+        # converts an ISO 8601 time stamp of the API (e.g.
+        # '2016-03-01T10:20:30.123+01:00') to seconds since the epoch
+        if value is None :
+            return 0.0
+        
+        result = calendar.timegm( time.strptime( value[:19], "%Y-%m-%dT%H:%M:%S" ) )
+        zone = value[19:].lstrip( ".0123456789" )
+        if len( zone ) >= 6 and zone[0] in "+-" :
+            offset = int( zone[1:3] ) * 3600 + int( zone[4:6] ) * 60
+            if zone[0] == "+" :
+                result = result - offset
+            else :
+                result = result + offset
+        return result
+    # end def
+    
+    
+    ############################################################################
+    # INDEXES
+    ############################################################################
+    
+    def _ngrams( self, value ) :
+        return set( value[ i : i + 3 ] for i in range( len( value ) - 2 ) )
+    # end def
+    
+    def _index_user( self, user ) :
+        self._username2user.setdefault( user['username'], user )
+        self._email2user.setdefault( user['email'], user )
+        
+        for key in ( user['username'], user['email'] ) :
+            for ngram in self._ngrams( key ) :
+                self._ngram2users.setdefault( ngram, set() ).add( user['id'] )
+    # end def
+    
+    def _index_users( self ) :
+        self._username2user = {}
+        self._email2user    = {}
+        self._ngram2users   = {}
+        self._user_searches = {}
+        for u in self._users :
+            self._index_user( u )
+    # end def
+    
+    def _index_groups( self ) :
+        self._path2group = {}
+        for g in self._groups :
+            self._path2group.setdefault( g['path'], g )
+    # end def
+    
+    def _index_namespaces( self ) :
+        self._path2namespace = {}
+        for ns in self._namespaces :
+            self._path2namespace.setdefault( ns['path'], ns )
+    # end def
+    
+    def _index_repo( self, repo ) :
+        self._path2repo.setdefault( repo['path_with_namespace'], repo )
+    # end def
+    
+    def _index_repos( self ) :
+        self._path2repo = {}
+        for r in self._repos :
+            self._index_repo( r )
+    # end def
+    
+    def _find_users( self, search ) :
+        # returns all users whose username or email contains 'search', for
+        # longer searches only the users sharing all its n-grams are checked
+        if len( search ) < 3 :
+            candidates = self._users
+        else :
+            ngrams = sorted \
+            ( [ self._ngram2users.get( ngram, set() ) for ngram in self._ngrams( search ) ]
+            , key = len
+            )
+            ids = set( ngrams[ 0 ] )
+            for ngram in ngrams[ 1: ] :
+                ids.intersection_update( ngram )
+            candidates = [ self._id2user[ i ] for i in ids ]
+        
+        return [ u for u in candidates if search in u['username'] or search in u['email'] ]
+    # end def
+    
+    
+    ############################################################################
+    # DUMP
+    ############################################################################
+    
+    def _iter_entries( self, name, url, cache = True ) :
+        # dumps do not fill the caches, the entries are taken from the cached
+        # list or streamed page by page from the server
+        entries = getattr( self, name )
+        if entries is not None and cache is True :
+            for e in entries :
+                yield e
+            return
+        
+        for page in self._iter_pages( url, window = self._workers ) :
+            for e in page :
+                yield e
+    # end def
+    
+    def _format_text( self, stream, keys, titles, seperator, startOfLine, endOfLine ) :
+        def write( row ) :
+            stream.write( startOfLine + seperator.join( [ "%s" % v for v in row ] ) + endOfLine )
+        write( titles )
+        return write
+    # end def
+    
+    def _format_csv( self, stream, keys, titles, seperator, startOfLine, endOfLine, dialect = "excel" ) :
+        writer = csv.writer( stream, dialect = dialect )
+        def write( row ) :
+            writer.writerow( [ v.encode( "utf-8" ) if isinstance( v, unicode ) else v for v in row ] )
+        write( titles )
+        return write
+    # end def
+    
+    def _format_tsv( self, stream, keys, titles, seperator, startOfLine, endOfLine ) :
+        return self._format_csv( stream, keys, titles, seperator, startOfLine, endOfLine, "excel-tab" )
+    # end def
+    
+    def _format_jsonl( self, stream, keys, titles, seperator, startOfLine, endOfLine ) :
+        def write( row ) :
+            stream.write( json.dumps( dict( zip( keys, row ) ) ) + "\n" )
+        return write
+    # end def
+    
+    def _dump( self, entries, columns, format, stream, seperator, startOfLine, endOfLine ) :
+        # writes every entry as soon as it is available, 'columns' is a list
+        # of ( key, title, value function ) tuples and 'format' is either one
+        # of "text", "csv", "tsv" and "jsonl" or a function with the
+        # signature of the '_format_*' methods which returns a row writer
+        keys   = [ c[ 0 ] for c in columns ]
+        titles = [ c[ 1 ] for c in columns ]
+        
+        if callable( format ) :
+            writer = format
+        else :
+            writer = getattr( self, "_format_%s" % format )
+        
+        write = writer( stream, keys, titles, seperator, startOfLine, endOfLine )
+        for e in entries :
+            write( [ c[ 2 ]( e ) for c in columns ] )
+    # end def
+    
+    
+    ############################################################################
+    # SNAPSHOT
+    ############################################################################
+    
+    # cached lists which are persisted and the id maps derived from them
+    _snapshot_caches = \
+    [ ( "_users",      "_id2user" )
+    , ( "_groups",     "_id2group" )
+    , ( "_namespaces", "_id2namespace" )
+    , ( "_repos",      "_id2repo" )
+    ]
+    
+    # the 'marshal' format is only stable for a given interpreter version
+    _snapshot_format = "%d.%d/%d" % ( sys.version_info[0], sys.version_info[1], marshal.version )
+    
+    def _snapshot_db( self ) :
+        assert self._snapshot is not None, "no snapshot file configured!"
+        
+        db = sqlite3.connect( self._snapshot )
+        db.execute \
+        ( "CREATE TABLE IF NOT EXISTS snapshot "
+          "( name TEXT PRIMARY KEY, created REAL, format TEXT, data BLOB )"
+        )
+        return db
+    # end def
+    
+    def saveSnapshot( self ) :
+        db = self._snapshot_db()
+        with db :
+            for name, index in self._snapshot_caches :
+                cache = getattr( self, name )
+                if cache is None :
+                    continue
+                db.execute \
+                ( "INSERT OR REPLACE INTO snapshot VALUES ( ?, ?, ?, ? )"
+                , ( name
+                  , self._synced.get( name, time.time() )
+                  , self._snapshot_format
+                  , buffer( marshal.dumps( [ e if isinstance( e, dict ) else e.asdict() for e in cache ] ) )
+                  )
+                )
+        db.close()
+    # end def
+    
+    def loadSnapshot( self ) :
+        # returns 'True' if all caches could be restored from the snapshot,
+        # expired or missing caches stay untouched and get fetched on demand
+        if not os.path.exists( self._snapshot ) :
+            return False
+        
+        db = self._snapshot_db()
+        rows = db.execute( "SELECT name, created, format, data FROM snapshot" ).fetchall()
+        db.close()
+        
+        restored = {}
+        for name, created, format, data in rows :
+            if format != self._snapshot_format :
+                continue
+            if self._snapshot_ttl is not None \
+            and time.time() - created > self._snapshot_ttl :
+                continue
+            restored[ name ] = self._compact( name, marshal.loads( str( data ) ) )
+            self._synced[ name ] = created
+        
+        with self._lock :
+            for name, index in self._snapshot_caches :
+                if name in restored :
+                    setattr( self, name, restored[ name ] )
+                    setattr( self, index, dict( ( e['id'], e ) for e in restored[ name ] ) )
+                    getattr( self, "_index%s" % name )()
+        
+        return len( restored ) == len( self._snapshot_caches )
+    # end def
+    
+    def dropSnapshot( self, *names ) :
+        # invalidates the given caches (e.g. "_users") or the whole snapshot
+        if self._snapshot is None or not os.path.exists( self._snapshot ) :
+            return
+        
+        db = self._snapshot_db()
+        with db :
+            if len( names ) == 0 :
+                db.execute( "DELETE FROM snapshot" )
+            for name in names :
+                db.execute( "DELETE FROM snapshot WHERE name = ?", ( name, ) )
+        db.close()
+    # end def
+    
+    
+    ############################################################################
+    # METRICS
+    ############################################################################
+    
+    def _hit( self, cache, hit ) :
+        if self._metrics is not None :
+            self._metrics.cache( cache, hit )
+    # end def
+    
+    def getMetrics( self ) :
+        # returns the request counts and latencies per endpoint, the requests
+        # per public method and the cache hits and misses as a dict
+        assert self._metrics is not None, "instrumentation is not enabled!"
+        return self._metrics.snapshot()
+    # end def
+    
+    def dumpMetrics( self, stream = sys.stdout, format = "prometheus" ) :
+        assert self._metrics is not None, "instrumentation is not enabled!"
+        if format == "prometheus" :
+            stream.write( self._metrics.prometheus() )
+        elif format == "json" :
+            json.dump( self._metrics.snapshot(), stream, indent = 2, sort_keys = True )
+            stream.write( "\n" )
+        else :
+            assert False, "invalid argument for 'format' parameter!"
+    # end def
+    
+    def resetMetrics( self ) :
+        assert self._metrics is not None, "instrumentation is not enabled!"
+        self._metrics.reset()
+    # end def
+    
+    
+    ############################################################################
+    # USER
+    ############################################################################
+    
+    def getUsers( self, cache = True ) :
+        with self._lock :
+            self._hit( "_users", self._users is not None and cache is True )
+            if self._users is not None and cache is False and self._incremental :
+                self._refresh_users()
+            elif self._users is None or cache is False :
+                self._synced[ "_users" ] = time.time()
+                self._users = self._get_pages( self._git.users_url, name = "_users" )
+            
+                self._id2user = {}
+                for u in self._users :
+                    self._id2user[ u['id'] ] = u
+                self._index_users()
+            
+        return self._users
+    # end def
+    
+    def _refresh_users( self ) :
+        # new users get higher ids, therefore the users with an id above the
+        # highest cached one are exactly the ones created since the last sync,
+        # the API has no modification time of users, so renamed users (and
+        # changed emails) are only seen when the deletion check walks the
+        # listing, through a 'user_rename' system hook event (see
+        # 'applyHook') or with 'incremental' disabled
+        self._synced[ "_users" ] = time.time()
+        
+        since = max( [ 0 ] + self._id2user.keys() ) + 1
+        users = self._get_delta \
+        ( self._git.users_url
+        , { "order_by" : "id", "sort" : "desc" }
+        , lambda u : u['id']
+        , since
+        )
+        self._merge( "_users", users, self._users, self._id2user )
+        self._reconcile( "_users", self._git.users_url, {}, self._users, self._id2user )
+        self._index_users()
+    # end def
+    
+    def getUser( self, username_or_email, cache = True ) :
+        if self._lazy and self._users is None and cache is True :
+            return self._get_user_lazy( username_or_email )
+        
+        self.getUsers( cache )
+        
+        # exact usernames and emails take precedence over the substring
+        # search, so a username which is part of other usernames resolves
+        user = self._username2user.get( username_or_email ) or self._email2user.get( username_or_email )
+        if user is not None :
+            return user
+        
+        users = self._find_users( username_or_email )
+        
+        if len( users ) == 0 or len( users ) > 1 :
+            return None
+        else :
+            return users[ 0 ]
+    # end def
+        
+    def getUserID( self, username_or_email, cache = True ) :
+        result = self.getUser( username_or_email, cache )
+        assert result is not None, "user does not exist!"
+        return result['id']
+    # end def
+    
+    def _get_user_lazy( self, username_or_email, exact = False ) :
+        # the server side search matches (case insensitive) username, email
+        # and name, so it yields a superset of the local substring search,
+        # users known by their exact username or email (e.g. from a hook
+        # event) are not searched, with 'exact' only such a user is returned
+        user = self._username2user.get( username_or_email ) or self._email2user.get( username_or_email )
+        if user is not None :
+            self._hit( "_user_searches", True )
+            return user
+        
+        self._hit( "_user_searches", username_or_email in self._user_searches )
+        if not ( username_or_email in self._user_searches ) :
+            users = []
+            for u in self._get_pages( self._git.users_url, { "search" : username_or_email }, bulk = False ) :
+                if username_or_email in u['username'] \
+                or username_or_email in u['email'] :
+                    users.append( u )
+            
+            matches = [ u for u in users if username_or_email in ( u['username'], u['email'] ) ]
+            if len( matches ) > 0 :
+                users = matches[ :1 ]
+            elif exact :
+                return None
+            if len( users ) != 1 :
+                return None
+            
+            with self._lock :
+                self._id2user[ users[ 0 ]['id'] ] = users[ 0 ]
+                self._index_user( users[ 0 ] )
+                self._user_searches[ username_or_email ] = users[ 0 ]
+            return users[ 0 ]
+        
+        user = self._user_searches[ username_or_email ]
+        if exact and not ( username_or_email in ( user['username'], user['email'] ) ) :
+            return None
+        return user
+    # end def
+    
+    def _get_user_by_id( self, user_id, cache = True ) : 
+        if self._lazy and self._users is None and cache is True :
+            self._hit( "_id2user", user_id in self._id2user )
+            if not ( user_id in self._id2user ) :
+                user = self._get_one( "%s/%s" % ( self._git.users_url, user_id ) )
+                if user is None :
+                    return None
+                with self._lock :
+                    self._id2user[ user_id ] = user
+                    self._index_user( user )
+                return user
+            return self._id2user[ user_id ]
+        
+        self.getUsers( cache )
+        self._hit( "_id2user", user_id in self._id2user )
+        
+        try :
+            return self._id2user[ user_id ]
+        except :
+            return None
+    # end def
+    
+    def hasUser( self, username_or_email, cache = True ) :
+        result = self.getUser( username_or_email, cache )
+        
+        if result is None :
+            return False
+        else :
+            return True
+    # end def
+
+    def addUser \
+    ( self
+    , fullname, username, password, email
+    , projects_limit = None
+    , can_create_group = None
+    , confirm = None
+    , admin = None
+    , skype = None
+    , linkedin = None
+    , twitter = None
+    , url = None
+    , bio = None
+    , ext = None
+    , eid = None
+    , epr = None
+    ) :        
+        params = self._user_params \
+        ( fullname, username, password, email
+        , projects_limit, can_create_group, confirm, admin, skype, linkedin, twitter, url, bio, ext, eid, epr
+        )
+        
+        result, error = self._post_user( params )
+        
+        if isinstance( result, dict ) :
+            print "gilapt: internal: user added", result['id'], result['name']
+            self.dropSnapshot( "_users" )
+        else :
+            sys.stderr.write( "gilapt: error: unable to add user '%s': %s\n" % ( username, error ) )
+        
+        return result
+    # end def
+    
+    def _user_params \
+    ( self
+    , fullname, username, password, email
+    , projects_limit = None
+    , can_create_group = None
+    , confirm = None
+    , admin = None
+    , skype = None
+    , linkedin = None
+    , twitter = None
+    , url = None
+    , bio = None
+    , ext = None
+    , eid = None
+    , epr = None
+    ) :        
+        params = {}
+        if projects_limit is not None :
+            params['projects_limit'] = projects_limit # Number of projects user can create
+        else :
+            params['projects_limit'] = 0
+        
+        if can_create_group is not None :
+            params['can_create_group'] = can_create_group # User can create groups - true or false
+        else :
+            params['can_create_group'] = "false"
+        
+        if confirm is not None :
+            params['confirm'] = confirm # Require confirmation - true (default) or false
+        if admin is not None :
+            params['admin'] = admin # User is admin - true or false (default)
+        if skype is not None :
+            params['skype'] = skype # Skype Account
+        if linkedin is not None :
+            params['linkedin'] = linkedin # LinkedIn Account
+        if twitter is not None :
+            params['twitter'] = twitter # Twitter Account
+        if url is not None :
+            params['website_url'] = url # Website URL
+        if bio is not None :
+            params['bio'] = bio # User's biography
+        if ext is not None :
+            params['external'] = ext # Flags the user as external - true or false(default)
+        if eid is not None :
+            params['extern_uid'] = eid # External UID
+        if epr is not None :
+            params['provider'] = epr # External Provider Name
+        
+        params['name']     = fullname
+        params['username'] = username
+        params['password'] = password
+        params['email']    = email
+        
+        return params
+    # end def
+    
+    def _post_user( self, params ) :
+        # creates a user, returns it and 'None' or 'False' and the reason of
+        # the failure
+        response = self._request( "POST", self._git.users_url, data = params )
+        if response.status_code != 201 :
+            try :
+                message = response.json().get( "message" )
+            except ValueError :
+                message = None
+            return False, "%d %s" % ( response.status_code, message or response.reason )
+        
+        result = response.json()
+        entry  = self._compact( "_users", [ result ] )[ 0 ]
+        with self._lock :
+            if self._users is not None :
+                self._users.append( entry )
+            self._user_searches = {}
+            self._id2user[ entry['id'] ] = entry
+            self._index_user( entry )
+        return result, None
+    # end def
+    
+    def importUsers( self, specs, journal = None, batch = 500, dry_run = False, credentials = None ) :
+        # creates the users of 'specs' (dicts with the arguments of 'addUser'
+        # or the path of a CSV file with these as column titles) concurrently.
+        # A user whose username or email exists already is not created again.
+        # A row without a password gets a random one only if the stream
+        # 'credentials' is given, it receives a "username,email,password" line.
+        # The rows done are appended to 'journal' and skipped on a rerun.
+        # Returns one dict per row with the keys "row", "username", "id",
+        # "error" and "outcome" ("created", "exists", "duplicate",
+        # "journaled", "planned" or "failed").
+        if isinstance( specs, basestring ) :
+            specs = self._user_specs( specs )
+        
+        done = set()
+        if journal is not None :
+            done = _org_journal( journal )
+        
+        self.getUsers()
+        
+        def create( task ) :
+            outcome, spec, generated = task
+            try :
+                result, error = self._post_user( self._user_params( **spec ) )
+            except Exception, e :
+                result, error = False, str( e )
+            
+            if isinstance( result, dict ) :
+                outcome.update( outcome = "created", id = result['id'] )
+                if generated :
+                    with self._lock :
+                        credentials.write( "%s,%s,%s\n" % ( spec['username'], spec['email'], spec['password'] ) )
+            elif error.startswith( "409 " ) :
+                # created by someone else (or by an interrupted run) after
+                # the users were listed
+                outcome.update( outcome = "exists", error = error )
+            else :
+                outcome.update( outcome = "failed", error = error )
+        
+        outcomes = []
+        seen     = set()
+        rows     = enumerate( specs, 1 )
+        log      = None
+        if journal is not None and not dry_run :
+            log = open( journal, "a" )
+        
+        try :
+            while True :
+                chunk = list( itertools.islice( rows, max( 1, batch ) ) )
+                if len( chunk ) == 0 :
+                    break
+                
+                keys    = {}
+                pending = []
+                for number, spec in chunk :
+                    spec     = dict( spec )
+                    username = spec.get( "username" )
+                    email    = spec.get( "email" )
+                    outcome  = { "row" : number, "username" : username, "outcome" : None, "id" : None, "error" : None }
+                    outcomes.append( outcome )
+                    
+                    public = dict( ( k, v ) for k, v in spec.items() if k != "password" )
+                    key = hashlib.sha1( json.dumps( public, sort_keys = True ) ).hexdigest()
+                    keys[ number ] = key
+                    
+                    if key in done :
+                        outcome[ "outcome" ] = "journaled"
+                        continue
+                    if not username or not email :
+                        outcome.update( outcome = "failed", error = "row has no username or email" )
+                        continue
+                    if username.lower() in seen or email.lower() in seen :
+                        outcome[ "outcome" ] = "duplicate"
+                        continue
+                    seen.add( username.lower() )
+                    seen.add( email.lower() )
+                    
+                    user = self._username2user.get( username ) or self._email2user.get( email )
+                    if user is not None :
+                        outcome.update( outcome = "exists", id = user['id'] )
+                    elif dry_run :
+                        outcome[ "outcome" ] = "planned"
+                    elif not spec.get( "password" ) and credentials is None :
+                        outcome.update( outcome = "failed", error = "row has no password and no credentials stream is given" )
+                    else :
+                        spec.setdefault( "fullname", username )
+                        generated = not spec.get( "password" )
+                        if generated :
+                            spec[ "password" ] = os.urandom( 12 ).encode( "hex" )
+                        pending.append( ( outcome, spec, generated ) )
+                
+                with self._bulk() :
+                    self._parallel( create, pending )
+                if credentials is not None :
+                    credentials.flush()
+                
+                if log is not None :
+                    for outcome in outcomes[ -len( chunk ) : ] :
+                        if outcome[ "outcome" ] in ( "created", "exists" ) :
+                            log.write( keys[ outcome[ "row" ] ] + "\n" )
+                    log.flush()
+                    os.fsync( log.fileno() )
+        finally :
+            if log is not None :
+                log.close()
+            if any( o[ "outcome" ] == "created" for o in outcomes ) :
+                self.dropSnapshot( "_users" )
+        
+        return outcomes
+    # end def
+    
+    def _user_specs( self, path ) :
+        # yields the rows of a CSV file with a header as dicts without their
+        # empty cells
+        with open( path ) as f :
+            for row in csv.DictReader( f ) :
+                yield dict( ( k.strip(), v.strip() ) for k, v in row.items() if k and v and len( v.strip() ) > 0 )
+    # end def
+    
+    def modUser( self, username_or_email, username = None, fullname = None, ext = None ) :
+        uid = self.getUserID( username_or_email )
+        
+        params = {}
+        if username is not None :
+            params['username'] = username
+        if fullname is not None :
+            params['name'] = fullname
+        if ext is not None :
+            if ext is True :
+                params['external'] = "true"
+            elif ext is False :
+                params['external'] = "false"
+        
+        self._call( "PUT", "%s/%s" % ( self._git.users_url, uid ), 200, data = params )
+    # end def
+    
+    def dumpUsers( self, search = "", cache = True, stream = sys.stdout, seperator = ", ", startOfLine = "", endOfLine = "\n", format = "text" ) :
+        users = \
+        ( u for u in self._iter_entries( "_users", self._git.users_url, cache )
+          if len( search ) == 0
+          or search in u['username']
+          or search in u['email']
+        )
+        
+        self._dump \
+        ( users
+        , [ ( "id",       "ID",        lambda u : u['id'] )
+          , ( "username", "User Name", lambda u : u['username'] )
+          , ( "name",     "Full Name", lambda u : u['name'] )
+          , ( "email",    "Email",     lambda u : u['email'] )
+          ]
+        , format, stream, seperator, startOfLine, endOfLine
+        )
+    # end def
+
+    
+    ############################################################################
+    # GROUP
+    ############################################################################
+    
+    def getGroups( self, cache = True ) :
+        with self._lock :
+            self._hit( "_groups", self._groups is not None and cache is True )
+            if self._groups is None or cache is False :        
+                self._groups = self._get_pages( self._git.groups_url )
+
+                self._id2group = {}
+                for g in self._groups :
+                    self._id2group[ g['id'] ] = g
+                self._index_groups()
+            
+        return self._groups
+    # end def
+    
+    def getGroup( self, groupname, cache = True ) :
+        if self._lazy and self._groups is None and cache is True :
+            self._hit( "_path2group", groupname in self._path2group )
+            if not ( groupname in self._path2group ) :
+                group = self._get_one( "%s/%s" % ( self._git.groups_url, urllib.quote( groupname, safe = "" ) ) )
+                if group is None or group['path'] != groupname :
+                    return None
+                with self._lock :
+                    self._id2group[ group['id'] ] = group
+                    self._path2group[ groupname ] = group
+                return group
+            return self._path2group[ groupname ]
+        
+        self.getGroups( cache )
+        return self._path2group.get( groupname )
+    # end def
+
+    def getGroupID( self, groupname, cache = True ) :
+        result = self.getGroup( groupname, cache )
+        assert result is not None, "group does not exist!"
+        return result['id']
+    # end def
+
+    def _get_group_by_id( self, group_id, cache = True ) : 
+        self.getGroups( cache )
+        self._hit( "_id2group", group_id in self._id2group )
+        
+        try :
+            return self._id2group[ group_id ]
+        except :
+            return None
+    # end def
+    
+    def hasGroup( self, groupname, cache = True ) :
+        result = self.getGroup( groupname, cache )
+        
+        if result is None :
+            return False
+        else :
+            return True
+    # end def
+    
+    def dumpGroups( self, search = "", cache = True, stream = sys.stdout, seperator = ", ", startOfLine = "", endOfLine = "\n", format = "text" ) :
+        groups = \
+        ( g for g in self._iter_entries( "_groups", self._git.groups_url, cache )
+          if len( search ) == 0 or search in g['path']
+        )
+        
+        self._dump \
+        ( groups
+        , [ ( "id",          "ID",          lambda g : g['id'] )
+          , ( "path",        "Group Name",  lambda g : g['path'] )
+          , ( "description", "Description", lambda g : g['description'] )
+          ]
+        , format, stream, seperator, startOfLine, endOfLine
+        )
+    # end def
+    
+    ############################################################################
+    # NAMESPACES
+    ############################################################################
+    
+    def getNamespaces( self, cache = True ) :
+        with self._lock :
+            self._hit( "_namespaces", self._namespaces is not None and cache is True )
+            if self._namespaces is None or cache is False :
+                self._namespaces = self._get_pages( "%s/namespaces" % self._git.api_url )
+            
+                for ns in self._namespaces :
+                    self._id2namespace[ ns['id'] ] = ns
+                self._index_namespaces()
+            
+        return self._namespaces
+    # end def
+
+    def getNamespace( self, namespace, cache = True ) :
+        if self._lazy and self._namespaces is None and cache is True :
+            self._hit( "_path2namespace", namespace in self._path2namespace )
+            if not ( namespace in self._path2namespace ) :
+                for ns in self._get_pages( "%s/namespaces" % self._git.api_url, { "search" : namespace }, bulk = False ) :
+                    if ns['path'] == namespace :
+                        with self._lock :
+                            self._id2namespace[ ns['id'] ] = ns
+                            self._path2namespace[ namespace ] = ns
+                        return ns
+            return self._path2namespace.get( namespace )
+        
+        self.getNamespaces( cache )
+        return self._path2namespace.get( namespace )
+    # end def
+    
+    def hasNamespace( self, namespace, cache = True ) :
+        result = self.getNamespace( namespace, cache )
+
+        if result is None :
+            return False
+        else :
+            return True
+    # end def
+
+    def dumpNamespaces( self, search = "", cache = True, stream = sys.stdout, seperator = ", ", startOfLine = "", endOfLine = "\n", format = "text" ) :
+        namespaces = \
+        ( ns for ns in self._iter_entries( "_namespaces", "%s/namespaces" % self._git.api_url, cache )
+          if len( search ) == 0 or search in ns['path']
+        )
+        
+        self._dump \
+        ( namespaces
+        , [ ( "id",   "ID",        lambda ns : ns['id'] )
+          , ( "kind", "Kind",      lambda ns : ns['kind'] )
+          , ( "path", "Namespace", lambda ns : ns['path'] )
+          ]
+        , format, stream, seperator, startOfLine, endOfLine
+        )
+    # end def
+    
+    
+    ############################################################################
+    # REPOSITORIES
+    ############################################################################
+    
+    def getRepos( self, cache = True ) :
+        with self._lock :
+            self._hit( "_repos", self._repos is not None and cache is True )
+            if self._repos is not None and cache is False and self._incremental :
+                self._refresh_repos()
+            elif self._repos is None or cache is False :
+                self._synced[ "_repos" ] = time.time()
+                self._repos = self._get_pages( self._git.projects_url, name = "_repos" )
+
+                for r in self._repos :
+                    self._id2repo[ r['id'] ] = r
+                self._index_repos()
+            
+        return self._repos
+    # end def
+    
+    def _refresh_repos( self ) :
+        # the repos with any activity since the last sync (minus some slack
+        # for clock skew) are fetched most recent first
+        since = self._synced.get( "_repos", 0 ) - 300
+        self._synced[ "_repos" ] = time.time()
+        
+        repos = self._get_delta \
+        ( self._git.projects_url
+        , { "order_by" : "last_activity_at"
+          , "sort" : "desc"
+          , "last_activity_after" : time.strftime( "%Y-%m-%dT%H:%M:%SZ", time.gmtime( since ) )
+          }
+        , lambda r : self._timestamp( r.get( "last_activity_at" ) )
+        , since
+        )
+        self._merge( "_repos", repos, self._repos, self._id2repo )
+        self._reconcile( "_repos", self._git.projects_url, {}, self._repos, self._id2repo )
+        self._index_repos()
+    # end def
+    
+    def getRepo( self, repopath, cache = True ) :
+        if self._lazy and self._repos is None and cache is True :
+            self._hit( "_path2repo", repopath in self._path2repo )
+            if not ( repopath in self._path2repo ) :
+                repo = self._get_one( "%s/%s" % ( self._git.projects_url, urllib.quote( repopath, safe = "" ) ) )
+                if repo is None or repo['path_with_namespace'] != repopath :
+                    return None
+                with self._lock :
+                    self._id2repo[ repo['id'] ] = repo
+                    self._index_repo( repo )
+            return self._path2repo[ repopath ]
+        
+        self.getRepos( cache )
+        return self._path2repo.get( repopath )
+    # end def
+    
+    def getRepoID( self, repopath, cache = True ) :
+        result = self.getRepo( repopath, cache )
+        assert result is not None, "repo does not exist!"
+        return result['id']
+    # end def
+    
+    def _get_repo_by_id( self, repo_id, cache = True ) : 
+        if self._lazy and self._repos is None and cache is True :
+            self._hit( "_id2repo", repo_id in self._id2repo )
+            if not ( repo_id in self._id2repo ) :
+                repo = self._get_one( "%s/%s" % ( self._git.projects_url, repo_id ) )
+                if repo is None :
+                    return None
+                with self._lock :
+                    self._id2repo[ repo_id ] = repo
+                    self._index_repo( repo )
+                return repo
+            return self._id2repo[ repo_id ]
+        
+        self.getRepos( cache )
+        self._hit( "_id2repo", repo_id in self._id2repo )
+        
+        try :
+            return self._id2repo[ repo_id ]
+        except :
+            return None
+    # end def
+    
+    def hasRepo( self, repopath, cache = True ) :
+        result = self.getRepo( repopath, cache )
+        
+        if result is None :
+            return False
+        else :
+            return True
+    # end def
+
+    def addRepo \
+    ( self
+    , name
+    , namespace
+    , description
+    , public = False
+    , issues = True
+    , snippets = True
+    , merge = True
+    , wiki = True
+    , builds = True
+    , path = None
+    ) :
+        params = {}        
+        params['namespace_id'] = self.getNamespace( namespace )['id']
+        params['description']  = description
+        
+        if public :
+            params['public'] = "true"
+        else :
+            params['public'] = "false"
+
+        if issues :
+            params['issues_enabled'] = "true"
+        else :
+            params['issues_enabled'] = "false"
+            
+        if snippets :
+            params['snippets_enabled'] = "true"
+        else :
+            params['snippets_enabled'] = "false"
+
+        if merge :
+            params['merge_requests_enabled'] = "true"
+        else :
+            params['merge_requests_enabled'] = "false"
+
+        if wiki :
+            params['wiki_enabled'] = "true"
+        else :
+            params['wiki_enabled'] = "false"
+
+        if builds :
+            params['builds_enabled'] = "true"
+        else :
+            params['builds_enabled'] = "false"
+        
+        params['name'] = name
+        if path is not None :
+            params['path'] = path
+        
+        result = self._call( "POST", self._git.projects_url, 201, data = params )
+        
+        if isinstance( result, dict ) :
+            print "gilapt: internal: repo added", result['id'], result['path_with_namespace']
+            entry = self._compact( "_repos", [ result ] )[ 0 ]
+            with self._lock :
+                if self._repos is not None :
+                    self._repos.append( entry )
+                self._id2repo[ entry['id'] ] = entry
+                self._index_repo( entry )
+            self.dropSnapshot( "_repos" )
+        
+        return result
+    # end def
+    
+    def dumpRepos( self, search = "", cache = True, stream = sys.stdout, seperator = ", ", startOfLine = "", endOfLine = "\n", format = "text" ) :
+        repos = \
+        ( r for r in self._iter_entries( "_repos", self._git.projects_url, cache )
+          if len( search ) == 0 or search in r['path_with_namespace']
+        )
+        
+        # the owners are joined through the user id index
+        if self._lazy and self._users is None :
+            lookup = self._get_user_by_id
+        else :
+            self.getUsers()
+            lookup = self._id2user.get
+        
+        def owner( r ) :
+            user = None
+            if r['namespace'].get( 'owner_id' ) is not None :
+                user = lookup( r['namespace']['owner_id'] )
+            if user is None :
+                return ""
+            return user['username']
+        
+        self._dump \
+        ( repos
+        , [ ( "id",                  "ID",              lambda r : r['id'] )
+          , ( "path_with_namespace", "Repository Path", lambda r : r['path_with_namespace'] )
+          , ( "description",         "Description",     lambda r : r['description'] )
+          , ( "public",              "Public",          lambda r : r['public'] )
+          , ( "owner",               "Owner",           owner )
+          ]
+        , format, stream, seperator, startOfLine, endOfLine
+        )
+    # end def
+    
+    
+    ############################################################################
+    # BRANCHES
+    ############################################################################
+
+    def _get_branches( self, uid, cache = True ) :
+        # all branches of a repo are fetched with one listing and kept for
+        # 'branch_ttl' seconds
+        if not ( uid in self._branches ) \
+        or cache is False \
+        or time.time() - self._branches[ uid ][ 0 ] > self._branch_ttl :
+            self._hit( "_branches", False )
+            listed = time.time()
+            branches = self._get_pages( "%s/%s/repository/branches" % ( self._git.projects_url, uid ) )
+            branches = dict( ( b['name'], b ) for b in branches )
+            with self._lock :
+                self._branches[ uid ] = ( listed, branches )
+            return branches
+        else :
+            self._hit( "_branches", True )
+        return self._branches[ uid ][ 1 ]
+    # end def
+    
+    def getBranches( self, repopath, cache = True ) :
+        uid = self.getRepoID( repopath, cache )
+        
+        return self._get_branches( uid, cache ).values()
+    # end def
+    
+    def getBranch( self, repopath, branch, cache = True ) :
+        uid = self.getRepoID( repopath, cache )
+        
+        return self._get_branches( uid, cache ).get( branch )
+    # end def
+    
+    def hasBranch( self, repopath, branch, cache = True ) :
+        result = self.getBranch( repopath, branch, cache )
+        
+        if result is None :
+            return False
+        else :
+            return True
+    # end def
+    
+    def _has_branches( self, uid, cache = True ) :
+        # tells whether the branch list of the repo is cached and fresh
+        return cache is True \
+        and uid in self._branches \
+        and time.time() - self._branches[ uid ][ 0 ] <= self._branch_ttl
+    # end def
+    
+    def addBranch( self, repopath, new_branch, old_branch, cache = True ) :
+        uid = self.getRepoID( repopath, cache )
+        
+        # with the branch list cached both branches are checked up front,
+        # otherwise the server tells which one is wrong (so bulk calls need
+        # a single request per repo, see 'applyRepos')
+        if self._has_branches( uid, cache ) :
+            if self.hasBranch( repopath, new_branch, cache ) :
+                assert False, "repo 'new_branch' already exists!"
+            if not self.hasBranch( repopath, old_branch, cache ) :
+                assert False, "repo 'old_branch' does not exist!"
+        
+        response = self._request \
+        ( "POST"
+        , "%s/%s/repository/branches" % ( self._git.projects_url, uid )
+        , data = { "branch_name" : new_branch, "ref" : old_branch }
+        )
+        if response.status_code == 400 :
+            try :
+                message = response.json().get( "message" )
+            except ValueError :
+                message = None
+            if message == "Branch already exists" :
+                assert False, "repo 'new_branch' already exists!"
+            if message == "Invalid reference name" :
+                assert False, "repo 'old_branch' does not exist!"
+        if response.status_code != 201 :
+            return False
+        
+        result = response.json()
+        with self._lock :
+            if uid in self._branches :
+                self._branches[ uid ][ 1 ][ new_branch ] = result
+        return result
+    # end def
+    
+    def modBranch( self, repopath, branch, protect, cache = True ) :
+        uid = self.getRepoID( repopath, cache )
+        
+        # like 'addBranch' only a cached branch list is checked up front,
+        # otherwise a missing branch is told by the server (404)
+        if self._has_branches( uid, cache ) :
+            if not self.hasBranch( repopath, branch, cache ) :
+                assert False, "repo branch does not exist!"
+        
+        if protect :
+            action = "protect"
+        else :
+            action = "unprotect"
+        
+        response = self._request \
+        ( "PUT"
+        , "%s/%s/repository/branches/%s/%s" % ( self._git.projects_url, uid, urllib.quote( branch, safe = "" ), action )
+        )
+        if response.status_code == 404 :
+            assert False, "repo branch does not exist!"
+        result = response.status_code == 200
+        
+        if result is True :
+            with self._lock :
+                if branch in self._branches.get( uid, ( 0, {} ) )[ 1 ] :
+                    self._branches[ uid ][ 1 ][ branch ]['protected'] = protect
+        return result
+    # end def
+
+    
+    ############################################################################
+    # MEMBERS
+    ############################################################################
+    
+    _access_levels = \
+    { "guest" : 10
+    , "reporter" : 20
+    , "developer" : 30
+    , "master" : 40
+    }
+    
+    def getMembers( self, repopath, cache = True ) :
+        # returns the full member records of the repo, these are cached until
+        # the row of the repo in the matrix changes (see '_get_access')
+        uid = self.getRepoID( repopath, cache )
+        
+        self._hit( "_members", uid in self._members and cache is True )
+        if uid in self._members and cache is True :
+            return self._members[ uid ]
+        
+        members = self._get_pages( "%s/%s/members" % ( self._git.projects_url, uid ) )
+        self._set_members( uid, [ ( m['id'], m['access_level'] ) for m in members ] )
+        with self._lock :
+            self._members[ uid ] = members
+        return members
+    # end def
+    
+    def _get_members( self, rid ) :
+        # returns the user id and access level of every member of the repo
+        levels = []
+        for page in self._iter_pages \
+        ( "%s/%s/members" % ( self._git.projects_url, rid )
+        , convert = lambda page : [ ( m['id'], m['access_level'] ) for m in page ]
+        ) :
+            levels.extend( page )
+        return levels
+    # end def
+    
+    def _get_access( self, rid, cache = True ) :
+        # returns the row of the repo in the matrix, the members are listed
+        # if it is not known yet
+        self._hit( "_repo2access", rid in self._repo2access and cache is True )
+        if not ( rid in self._repo2access ) or cache is False :
+            self._set_members( rid, self._get_members( rid ) )
+        return self._repo2access[ rid ]
+    # end def
+    
+    def _set_members( self, rid, levels ) :
+        # replaces the row of the repo in the matrix by the given user ids
+        # and access levels
+        with self._lock :
+            self._members.pop( rid, None )
+            for uid in self._repo2access.get( rid, {} ) :
+                del self._user2access[ uid ][ rid ]
+            
+            self._repo2access[ rid ] = {}
+            for uid, access_level in levels :
+                self._set_access( rid, uid, access_level )
+    # end def
+    
+    def _set_access( self, rid, uid, access_level ) :
+        with self._lock :
+            self._members.pop( rid, None )
+            self._repo2access.setdefault( rid, {} )[ uid ] = access_level
+            self._user2access.setdefault( uid, {} )[ rid ] = access_level
+    # end def
+    
+    def _drop_access( self, rid, uid ) :
+        with self._lock :
+            self._members.pop( rid, None )
+            self._repo2access.get( rid, {} ).pop( uid, None )
+            self._user2access.get( uid, {} ).pop( rid, None )
+    # end def
+    
+    def syncMemberships( self, repopaths = None, cache = True ) :
+        # fetches the members of all repos (or the given ones) concurrently,
+        # repos which are already known are skipped unless 'cache' is False
+        if repopaths is None :
+            repos = self.getRepos( cache )
+        else :
+            repos = []
+            for repopath in repopaths :
+                repo = self.getRepo( repopath, cache )
+                assert repo is not None, "repo '%s' does not exist!" % repopath
+                repos.append( repo )
+        
+        repos = [ r for r in repos if cache is False or not ( r['id'] in self._repo2access ) ]
+        with self._bulk() :
+            listed = self._parallel( lambda r : self._get_members( r['id'] ), repos )
+        for repo, levels in zip( repos, listed ) :
+            self._set_members( repo['id'], levels )
+    # end def
+    
+    def getMemberships( self, username_or_email, cache = True ) :
+        # returns the access level of the user per repo path for all repos
+        # whose members are known (see 'syncMemberships')
+        uid = self.getUserID( username_or_email, cache )
+        
+        result = {}
+        for rid, access_level in self._user2access.get( uid, {} ).items() :
+            repo = self._get_repo_by_id( rid )
+            if repo is not None :
+                result[ repo['path_with_namespace'] ] = access_level
+        return result
+    # end def
+    
+    def hasMember( self, repopath, username_or_email, cache = True ) :
+        rid = self.getRepoID( repopath, cache )
+        uid = self.getUserID( username_or_email, cache )
+        
+        return uid in self._get_access( rid, cache )
+    # end def
+    
+    def dumpMembers( self, search = "", stream = sys.stdout, seperator = ", ", startOfLine = "", endOfLine = "\n", format = "text" ) :
+        # writes the known memberships (see 'syncMemberships') of all repos
+        # whose path contains 'search'
+        levels = dict( ( v, k ) for k, v in self._access_levels.items() )
+        
+        def memberships() :
+            for rid, access in self._repo2access.items() :
+                repo = self._get_repo_by_id( rid )
+                if repo is None :
+                    continue
+                if len( search ) != 0 and not ( search in repo['path_with_namespace'] ) :
+                    continue
+                for uid, access_level in access.items() :
+                    user = self._get_user_by_id( uid )
+                    yield ( repo, user, uid, access_level )
+        
+        self._dump \
+        ( memberships()
+        , [ ( "repo",         "Repository Path", lambda m : m[ 0 ]['path_with_namespace'] )
+          , ( "user",         "User Name",       lambda m : m[ 1 ]['username'] if m[ 1 ] is not None else m[ 2 ] )
+          , ( "access_level", "Access Level",    lambda m : levels.get( m[ 3 ], m[ 3 ] ) )
+          ]
+        , format, stream, seperator, startOfLine, endOfLine
+        )
+    # end def
+    
+    def addMember( self, repopath, username_or_email, access_level = None, cache = True ) :        
+        if not self.hasRepo( repopath, cache ) :
+            assert False, "repo does not exist!"        
+        if not self.hasUser( username_or_email, cache ) :
+            assert False, "user does not exist!"        
+        if self.hasMember( repopath, username_or_email, cache ) :
+            assert False, "repo 'member' already exists!"
+        allowed_rights = [ "guest", "reporter", "developer", "master" ]
+        if not ( access_level in allowed_rights ) :
+            assert False, "invalid argument for 'access_level' parameter!"
+        
+        rid = self.getRepoID( repopath, cache )
+        uid = self.getUserID( username_or_email, cache )
+        
+        result = self._add_member( rid, uid, access_level )
+        if result is True :
+            self._set_access( rid, uid, self._access_levels[ access_level ] )
+        return result
+    # end def
+    
+    def _add_member( self, rid, uid, access_level ) :
+        return self._call \
+        ( "POST"
+        , "%s/%s/members" % ( self._git.projects_url, rid )
+        , 201
+        , data = { "user_id" : uid, "access_level" : self._access_levels[ access_level ] }
+        ) is not False
+    # end def
+    
+    def addMembers( self, repopath, users, access_level = None, cache = True ) :
+        # adds all 'users' (usernames or emails) which are not yet members,
+        # returns a dict with the outcome for every user
+        desired = dict( ( u, access_level ) for u in users )
+        return self._sync_members( repopath, desired, False, False, cache )
+    # end def
+    
+    def syncMembers( self, repopath, users, access_level = None, remove = False, cache = True ) :
+        # makes the members of the repo match 'users', which is either a dict
+        # mapping usernames or emails to access levels or a list of them
+        # which all get 'access_level', only with 'remove' enabled the
+        # members which are not listed are removed, returns a dict with the
+        # outcome for every user
+        if isinstance( users, dict ) :
+            desired = users
+        else :
+            desired = dict( ( u, access_level ) for u in users )
+        return self._sync_members( repopath, desired, True, remove, cache )
+    # end def
+    
+    def resolveUsers( self, users, cache = True ) :
+        # returns the user of every username or email in 'users' or 'None'
+        # if none has exactly this username or email, unlike 'getUser' there
+        # is no substring match, so a bulk call never picks another account
+        if self._lazy and self._users is None and cache is True :
+            return self._parallel( lambda u : self._get_user_lazy( u, exact = True ), users )
+        
+        self.getUsers( cache )
+        return [ self._username2user.get( u ) or self._email2user.get( u ) for u in users ]
+    # end def
+    
+    def _sync_members( self, repopath, desired, update, remove, cache ) :
+        # the outcome of each user is one of "added", "updated", "removed",
+        # "unchanged", "exists" (and not updated), "unknown" (user does not
+        # exist) or "failed" (the request was not successful)
+        for name, access_level in desired.items() :
+            if not ( access_level in self._access_levels ) :
+                assert False, "invalid access level %r of '%s', expected one of %s!" \
+                % ( access_level, name, ", ".join( sorted( self._access_levels, key = self._access_levels.get ) ) )
+        
+        rid = self.getRepoID( repopath, cache )
+        members = dict( self._get_access( rid, cache ) )
+        
+        result = {}
+        tasks  = []
+        wanted = set()
+        names  = desired.keys()
+        
+        for name, user in zip( names, self.resolveUsers( names, cache ) ) :
+            if user is None :
+                result[ name ] = "unknown"
+                continue
+            
+            wanted.add( user['id'] )
+            access_level = desired[ name ]
+            current = members.get( user['id'] )
+            
+            if current is None :
+                tasks.append( ( name, "added", user['id'], access_level ) )
+            elif current == self._access_levels[ access_level ] :
+                result[ name ] = "unchanged"
+            elif update :
+                tasks.append( ( name, "updated", user['id'], access_level ) )
+            else :
+                result[ name ] = "exists"
+        
+        if remove :
+            for uid in members :
+                if not ( uid in wanted ) :
+                    user = self._get_user_by_id( uid )
+                    tasks.append( ( user['username'] if user is not None else uid, "removed", uid, None ) )
+        
+        def apply( task ) :
+            name, action, uid, access_level = task
+            if action == "added" :
+                return self._add_member( rid, uid, access_level )
+            url = "%s/%s/members/%s" % ( self._git.projects_url, rid, uid )
+            if action == "updated" :
+                return self._call( "PUT", url, 200, data = { "access_level" : self._access_levels[ access_level ] } ) is not False
+            else :
+                return self._call( "DELETE", url, 200 ) is not False
+        
+        with self._bulk() :
+            outcomes = self._parallel( apply, tasks )
+        with self._lock :
+            for task, outcome in zip( tasks, outcomes ) :
+                name, action, uid, access_level = task
+                if outcome is not True :
+                    result[ name ] = "failed"
+                    continue
+                
+                result[ name ] = action
+                if action == "removed" :
+                    self._drop_access( rid, uid )
+                else :
+                    self._set_access( rid, uid, self._access_levels[ access_level ] )
+        
+        return result
+    # end def
+    
+    def addGroup( self, repopath, groupname, access_level = None, cache = True ) :        
+        if not self.hasRepo( repopath, cache ) :
+            assert False, "repo does not exist!"        
+        if not self.hasGroup( groupname, cache ) :
+            assert False, "group does not exist!"        
+        
+        if not ( access_level in self._access_levels ) :
+            assert False, "invalid argument for 'access_level' parameter!"
+        
+        rid = self.getRepoID( repopath, cache )
+        gid = self.getGroupID( groupname, cache )
+
+        
+        return self._call \
+        ( "POST"
+        , "%s/%s/share" % ( self._git.projects_url, rid )
+        , 201
+        , data = { "group_id" : gid, "group_access" : self._access_levels[ access_level ] }
+        ) is not False
+    # end def
+
+    def modMember( self, repopath, branch, protect, cache = True ) :
+        # if not self.hasBranch( repopath, branch, cache ) :
+        #     assert False, "repo branch does not exist!"
+
+        # uid = self.getRepoID( repopath, cache )
+        
+        # if protect :
+        #     git.protectbranch( uid, branch )
+        # else :
+        #     git.unprotectbranch( uid, branch )
+        pass
+    # end def
+
+        
+    
+    ############################################################################
+    # MILESTONES
+    ############################################################################
+
+    ## TODO: FIXME: PPA: this needs more attention!!!
+    def addMilestone( self, repopath, title, description, deadline, cache = True ) :
+        repo = self.getRepo( repopath, cache )
+        uid = repo['id']
+        
+        result = self._call \
+        ( "POST"
+        , "%s/%s/milestones" % ( self._git.projects_url, uid )
+        , 201
+        , data = { "title" : title, "description" : description, "due_date" : deadline }
+        )
+        #print result
+        #if result != True :
+        #sys.stderr.write( "gilapt: error: unable to add file '%s' at repo '%s' @ '%s'\n" % ( filepath, repopath, branch ) )
+        return result
+    # end def
+    
+    ############################################################################
+    # FILES
+    ############################################################################
+
+    def getFile( self, repopath, branch, filepath, cache = True ) :
+        repo = self.getRepo( repopath, cache )
+        uid = repo['id']
+        
+        if repo['default_branch'] is not None :
+            if not self.hasBranch( repopath, branch, cache ) :
+                assert False, "repo branch does not exist!"
+        
+        result = self._call \
+        ( "GET"
+        , "%s/%s/repository/files" % ( self._git.projects_url, uid )
+        , 200
+        , params = { "file_path" : filepath, "ref" : branch }
+        )
+        if isinstance( result, dict ) :
+            return result
+        else :
+            return None
+    # end def
+
+    def hasFile( self, repopath, branch, filepath, cache = True ) :
+        repo = self.getRepo( repopath, cache )
+        uid = repo['id']
+        
+        if repo['default_branch'] is not None :
+            if not self.hasBranch( repopath, branch, cache ) :
+                assert False, "repo branch does not exist!"
+        
+        return self._has_files( uid, branch, [ filepath ] )[ filepath ]
+    # end def
+    
+    def _get_tree( self, uid, branch, path ) :
+        # returns the names and types of all entries of the directory 'path'
+        result = self._get_one \
+        ( "%s/%s/repository/tree" % ( self._git.projects_url, uid )
+        , { "ref_name" : branch, "path" : path }
+        )
+        if result is None :
+            return {}
+        return dict( ( e['name'], e['type'] ) for e in result )
+    # end def
+    
+    def _has_files( self, uid, branch, filepaths ) :
+        # checks the existence of files through one tree listing per
+        # directory instead of fetching the content of every file
+        directories = list( set( f.rpartition( "/" )[ 0 ] for f in filepaths ) )
+        trees = dict \
+        ( zip
+          ( directories
+          , self._parallel( lambda d : self._get_tree( uid, branch, d ), directories )
+          )
+        )
+        
+        result = {}
+        for f in filepaths :
+            directory, separator, name = f.rpartition( "/" )
+            result[ f ] = trees[ directory ].get( name ) == "blob"
+        return result
+    # end def
+    
+    def addFile( self, repopath, branch, filepath, data, commit_message, encoding = "text", cache = True ) :
+        repo = self.getRepo( repopath, cache )
+        uid = repo['id']
+
+        if repo['default_branch'] is not None :
+            if not self.hasBranch( repopath, branch, cache ) :
+                assert False, "repo branch does not exist!"
+        if self.hasFile( repopath, branch, filepath, cache ) :
+            assert False, "file already exists!"
+        
+        if not ( encoding in [ "text", "base64" ] ) :
+            assert False, "invalid encoding"
+        
+        result = self._call \
+        ( "POST"
+        , "%s/%s/repository/files" % ( self._git.projects_url, uid )
+        , 201
+        , data = \
+          { "file_path" : filepath
+          , "branch_name" : branch
+          , "encoding" : encoding
+          , "content" : data
+          , "commit_message" : commit_message
+          }
+        ) is not False
+        if result != True :
+            sys.stderr.write( "gilapt: error: unable to add file '%s' at repo '%s' @ '%s'\n" % ( filepath, repopath, branch ) )
+        return result
+    # end def
+    
+    def modFile( self, repopath, branch, filepath, data, commit_message, cache = True ) :
+        # can also be used to create files with no care if it already exists or not :)        
+        repo = self.getRepo( repopath, cache )
+        uid = repo['id']
+
+        if repo['default_branch'] is not None :
+            if not self.hasBranch( repopath, branch, cache ) :
+                assert False, "repo branch does not exist!"
+        
+        result = self._call \
+        ( "PUT"
+        , "%s/%s/repository/files" % ( self._git.projects_url, uid )
+        , 200
+        , data = \
+          { "file_path" : filepath
+          , "branch_name" : branch
+          , "content" : data
+          , "commit_message" : commit_message
+          }
+        ) is not False
+        assert result == True, "internal error!"
+        return result
+    # end def
+    
+    def getFileStream( self, repopath, branch, filepath, stream, chunk = 65536, cache = True ) :
+        # writes the raw content of a file in chunks to the file object (or
+        # the path of a local file) 'stream' instead of holding it base64
+        # encoded in memory like 'getFile', returns the number of bytes or
+        # 'None' if the file does not exist
+        repo = self.getRepo( repopath, cache )
+        uid = repo['id']
+        
+        if repo['default_branch'] is not None :
+            if not self.hasBranch( repopath, branch, cache ) :
+                assert False, "repo branch does not exist!"
+        
+        result = self._request \
+        ( "GET"
+        , "%s/%s/repository/blobs/%s" % ( self._git.projects_url, uid, urllib.quote( branch, safe = "" ) )
+        , params = { "filepath" : filepath }
+        , stream = True
+        )
+        try :
+            if result.status_code != 200 :
+                return None
+            
+            target = stream
+            if isinstance( stream, basestring ) :
+                target = open( stream, "wb" )
+            try :
+                size = 0
+                for data in result.iter_content( chunk ) :
+                    target.write( data )
+                    size = size + len( data )
+            finally :
+                if target is not stream :
+                    target.close()
+        finally :
+            result.close()
+        return size
+    # end def
+    
+    def addFileStream( self, repopath, branch, filepath, source, commit_message, cache = True ) :
+        # like 'addFile', but the content is read from 'source' (the path of
+        # a local file or an iterable of byte strings) and encoded while it
+        # is sent, so it is never held in memory as a whole
+        repo = self.getRepo( repopath, cache )
+        uid = repo['id']
+        
+        if repo['default_branch'] is not None :
+            if not self.hasBranch( repopath, branch, cache ) :
+                assert False, "repo branch does not exist!"
+        if self.hasFile( repopath, branch, filepath, cache ) :
+            assert False, "file already exists!"
+        
+        result = self._write_stream( "POST", uid, branch, filepath, source, commit_message ).status_code == 201
+        if result != True :
+            sys.stderr.write( "gilapt: error: unable to add file '%s' at repo '%s' @ '%s'\n" % ( filepath, repopath, branch ) )
+        return result
+    # end def
+    
+    def modFileStream( self, repopath, branch, filepath, source, commit_message, cache = True ) :
+        # like 'modFile' with the content of 'source' (see 'addFileStream')
+        repo = self.getRepo( repopath, cache )
+        uid = repo['id']
+        
+        if repo['default_branch'] is not None :
+            if not self.hasBranch( repopath, branch, cache ) :
+                assert False, "repo branch does not exist!"
+        
+        result = self._write_stream( "PUT", uid, branch, filepath, source, commit_message ).status_code == 200
+        assert result == True, "internal error!"
+        return result
+    # end def
+    
+    def _write_stream( self, method, uid, branch, filepath, source, commit_message ) :
+        # a local file is sent with its length (and can be retried), an
+        # iterable in chunked transfer encoding
+        fields = \
+        { "file_path"      : filepath
+        , "branch_name"    : branch
+        , "commit_message" : commit_message
+        }
+        if isinstance( source, basestring ) :
+            body = _upload( fields, source )
+        else :
+            body = _upload.encode( _upload.prefix( fields ), source )
+        
+        return self._request \
+        ( method
+        , "%s/%s/repository/files" % ( self._git.projects_url, uid )
+        , headers = { "Content-Type" : "application/json" }
+        , data = body
+        )
+    # end def
+    
+    def addCommit( self, repopath, branch, actions, commit_message, chunk = 100, cache = True ) :
+        # writes several files in a single commit, every action is a dict
+        # with the keys 'action' ("create", "update", "delete" or "move"),
+        # 'file_path' and depending on the action 'content', 'encoding' and
+        # 'previous_path', batches larger than 'chunk' actions are split
+        # into several commits, these are not atomic, if one fails the
+        # earlier ones stay committed (the error tells which)
+        repo = self.getRepo( repopath, cache )
+        uid = repo['id']
+        
+        if repo['default_branch'] is not None :
+            if not self.hasBranch( repopath, branch, cache ) :
+                assert False, "repo branch does not exist!"
+        
+        actions = [ dict( a ) for a in actions ]
+        for a in actions :
+            if not ( a['action'] in [ "create", "update", "delete", "move" ] ) :
+                assert False, "invalid action '%s'" % a['action']
+            if not ( a.get( 'encoding', "text" ) in [ "text", "base64" ] ) :
+                assert False, "invalid encoding"
+        
+        # all chunks are checked before the first one is committed
+        exists = self._has_files \
+        ( uid, branch
+        , [ a['file_path'] for a in actions ] + [ a['previous_path'] for a in actions if a['action'] == "move" ]
+        )
+        
+        for a in actions :
+            if a['action'] == "move" and not exists[ a['previous_path'] ] :
+                assert False, "file '%s' does not exist!" % a['previous_path']
+            if a['action'] == "move" and exists[ a['file_path'] ] :
+                assert False, "file '%s' already exists!" % a['file_path']
+            if a['action'] == "create" and exists[ a['file_path'] ] :
+                assert False, "file '%s' already exists!" % a['file_path']
+            if a['action'] == "delete" and not exists[ a['file_path'] ] :
+                assert False, "file '%s' does not exist!" % a['file_path']
+            if a['action'] == "update" and not exists[ a['file_path'] ] :
+                # like 'modFile' an update creates missing files
+                a['action'] = "create"
+        
+        parts = [ actions[ i : i + chunk ] for i in range( 0, len( actions ), chunk ) ]
+        for c, part in enumerate( parts ) :
+            message = commit_message
+            if len( parts ) > 1 :
+                message = "%s (%d/%d)" % ( commit_message, c + 1, len( parts ) )
+            
+            result = self._request \
+            ( "POST"
+            , "%s/%s/repository/commits" % ( self._git.projects_url, uid )
+            , json = { "branch_name" : branch, "commit_message" : message, "actions" : part }
+            )
+            if result.status_code != 201 :
+                sys.stderr.write( "gilapt: error: unable to commit %d files at repo '%s' @ '%s'\n" % ( len( part ), repopath, branch ) )
+                if c > 0 :
+                    # the earlier chunks can not be undone
+                    sys.stderr.write \
+                    ( "gilapt: error: chunks 1-%d of %d (%d files, up to '%s') were committed, '%s' and the %d files after it were not\n"
+                    % ( c, len( parts ), c * chunk, parts[ c - 1 ][ -1 ]['file_path'], part[ 0 ]['file_path'], len( actions ) - c * chunk - 1 )
+                    )
+                return False
+        return True
+    # end def
+    
+    
+    ############################################################################
+    # RECONCILE
+    ############################################################################
+    
+    def _slug( self, name ) :
+        # the path GitLab derives from the name of a repo created without a
+        # path (Rails' 'parameterize'), accents are dropped, every run of
+        # characters other than letters, digits, '-' and '_' becomes a '-'
+        # and leading and trailing '-' are removed
+        if isinstance( name, str ) :
+            name = name.decode( "utf-8" )
+        name = unicodedata.normalize( "NFKD", name ).encode( "ascii", "ignore" )
+        name = re.sub( r"-{2,}", "-", re.sub( r"[^a-zA-Z0-9\-_]+", "-", name ) )
+        return name.strip( "-" ).lower()
+    # end def
+    
+    def planState( self, state, prune = False, cache = True ) :
+        # compares the desired 'state' with the cached lists and returns the
+        # ordered steps which are needed to reach it, 'state' is a dict with
+        # the (optional) keys
+        #   "users"    : list of dicts with the arguments of 'addUser'
+        #   "repos"    : list of dicts with the arguments of 'addRepo'
+        #   "members"  : repo path -> username or email -> access level
+        #   "groups"   : repo path -> group name -> access level
+        #   "branches" : repo path -> branch name -> protected
+        # every step is a dict with its 'id', the 'action', the 'target', the
+        # 'args' of the call and the ids of the steps it 'requires', with
+        # 'prune' enabled members which are not listed get removed
+        plan = []
+        
+        def step( action, target, args, requires = () ) :
+            plan.append \
+            ( { "id"       : len( plan )
+              , "action"   : action
+              , "target"   : target
+              , "args"     : args
+              , "requires" : sorted( set( r for r in requires if r is not None ) )
+              }
+            )
+            return len( plan ) - 1
+        
+        for access in state.get( "members", {} ).values() + state.get( "groups", {} ).values() :
+            for access_level in access.values() :
+                if not ( access_level in self._access_levels ) :
+                    assert False, "invalid argument for 'access_level' parameter!"
+        
+        # one listing of every needed list, all further lookups are cached
+        self.getRepos( cache )
+        if len( state.get( "users", [] ) ) + len( state.get( "members", {} ) ) > 0 :
+            self.getUsers( cache )
+        if len( state.get( "groups", {} ) ) > 0 :
+            self.getGroups( cache )
+        
+        # users, keyed by username and email, a user exists only if its
+        # username or email is exactly taken (never by a substring match)
+        new_users = {}
+        for user in state.get( "users", [] ) :
+            known = self._username2user.get( user['username'] ) or self._email2user.get( user['email'] )
+            if known is None :
+                new_users[ user['username'] ] = new_users[ user['email'] ] \
+                = step( "addUser", user['username'], dict( user ) )
+        
+        # repos, keyed by path
+        new_repos = {}
+        for repo in state.get( "repos", [] ) :
+            repopath = "%s/%s" % ( repo['namespace'], repo.get( 'path' ) or self._slug( repo['name'] ) )
+            if not self.hasRepo( repopath ) :
+                new_repos[ repopath ] = step( "addRepo", repopath, dict( repo ) )
+        
+        def existing( section ) :
+            repopaths = [ r for r in state.get( section, {} ) if not ( r in new_repos ) ]
+            for repopath in repopaths :
+                assert self.hasRepo( repopath ), "repo '%s' does not exist!" % repopath
+            return repopaths
+        
+        # memberships, the members of all listed repos are fetched at once
+        self.syncMemberships( existing( "members" ), cache )
+        
+        for repopath, desired in sorted( state.get( "members", {} ).items() ) :
+            if repopath in new_repos :
+                changed = len( desired ) > 0 or prune
+            else :
+                changed = False
+                access = self._repo2access[ self.getRepoID( repopath ) ]
+                wanted = set()
+                for name in desired.keys() :
+                    user = self._username2user.get( name ) or self._email2user.get( name )
+                    if user is None :
+                        assert name in new_users, "user '%s' does not exist!" % name
+                        changed = True
+                        continue
+                    wanted.add( user['id'] )
+                    if access.get( user['id'] ) != self._access_levels[ desired[ name ] ] :
+                        changed = True
+                if prune and len( set( access ) - wanted ) > 0 :
+                    changed = True
+            
+            if changed :
+                step \
+                ( "syncMembers", repopath, { "repopath" : repopath, "users" : dict( desired ), "remove" : prune }
+                , [ new_repos.get( repopath ) ] + [ new_users.get( name ) for name in desired ]
+                )
+        
+        # group shares, only repos whose listing lacks the shares are fetched
+        repopaths = existing( "groups" )
+        missing = [ r for r in repopaths if self.getRepo( r ).get( 'shared_with_groups' ) is None ]
+        fetched = dict \
+        ( zip
+          ( missing
+          , self._parallel( lambda r : self._get_one( "%s/%s" % ( self._git.projects_url, self.getRepoID( r ) ) ), missing )
+          )
+        )
+        
+        for repopath, desired in sorted( state.get( "groups", {} ).items() ) :
+            shared = set()
+            if repopath in fetched :
+                shared = set( g['group_id'] for g in ( fetched[ repopath ] or {} ).get( 'shared_with_groups', [] ) )
+            elif not ( repopath in new_repos ) :
+                shared = set( g['group_id'] for g in self.getRepo( repopath )['shared_with_groups'] )
+            
+            for groupname, access_level in sorted( desired.items() ) :
+                assert self.hasGroup( groupname ), "group '%s' does not exist!" % groupname
+                if not ( self.getGroupID( groupname ) in shared ) :
+                    step \
+                    ( "addGroup", "%s %s" % ( repopath, groupname )
+                    , { "repopath" : repopath, "groupname" : groupname, "access_level" : access_level }
+                    , [ new_repos.get( repopath ) ]
+                    )
+        
+        # protected branches, the branches of all listed repos are fetched at once
+        repopaths = existing( "branches" )
+        self._parallel( lambda r : self._get_branches( self.getRepoID( r ), cache ), repopaths )
+        
+        for repopath, desired in sorted( state.get( "branches", {} ).items() ) :
+            for branch, protect in sorted( desired.items() ) :
+                if not ( repopath in new_repos ) :
+                    current = self.getBranch( repopath, branch )
+                    if current is not None and current['protected'] == bool( protect ) :
+                        continue
+                step \
+                ( "modBranch", "%s %s" % ( repopath, branch )
+                , { "repopath" : repopath, "branch" : branch, "protect" : bool( protect ) }
+                , [ new_repos.get( repopath ) ]
+                )
+        
+        return plan
+    # end def
+    
+    def _apply_step( self, step ) :
+        try :
+            result = getattr( self, step['action'] )( **step['args'] )
+        except AssertionError, e :
+            sys.stderr.write( "gilapt: error: %s '%s' failed: %s\n" % ( step['action'], step['target'], e ) )
+            return False
+        
+        if step['action'] == "syncMembers" :
+            return not ( "failed" in result.values() or "unknown" in result.values() )
+        return isinstance( result, dict ) or result is True
+    # end def
+    
+    def applyPlan( self, plan, dry_run = False, stream = sys.stdout ) :
+        # runs the steps of a plan (see 'planState') in waves, all steps whose
+        # required steps are done run concurrently, steps which require a
+        # failed step are skipped, returns the outcome ("planned", "done",
+        # "failed" or "skipped") of every step by its id
+        result = {}
+        
+        if dry_run :
+            for s in plan :
+                requires = ""
+                if len( s['requires'] ) > 0 :
+                    requires = " (after %s)" % ", ".join( "#%d" % r for r in s['requires'] )
+                stream.write( "#%d %s %s%s\n" % ( s['id'], s['action'], s['target'], requires ) )
+                result[ s['id'] ] = "planned"
+            return result
+        
+        pending = list( plan )
+        while len( pending ) > 0 :
+            ready = [ s for s in pending if all( r in result for r in s['requires'] ) ]
+            assert len( ready ) > 0, "plan has cyclic dependencies!"
+            started = set( s['id'] for s in ready )
+            pending = [ s for s in pending if not ( s['id'] in started ) ]
+            
+            runnable = []
+            for s in ready :
+                if all( result[ r ] == "done" for r in s['requires'] ) :
+                    runnable.append( s )
+                else :
+                    result[ s['id'] ] = "skipped"
+            
+            with self._bulk() :
+                outcomes = self._parallel( self._apply_step, runnable )
+            for s, outcome in zip( runnable, outcomes ) :
+                if outcome :
+                    result[ s['id'] ] = "done"
+                else :
+                    result[ s['id'] ] = "failed"
+        
+        return result
+    # end def
+    
+    def reconcile( self, state, prune = False, dry_run = False, cache = True, stream = sys.stdout ) :
+        # plans and applies the desired 'state', returns the plan and the
+        # outcome of every step
+        plan = self.planState( state, prune, cache )
+        return plan, self.applyPlan( plan, dry_run, stream )
+    # end def
+    
+    ############################################################################
+    # FAN-OUT
+    ############################################################################
+    
+    def selectRepos( self, namespace = None, pattern = None, repopaths = None, cache = True ) :
+        # returns the paths of the repos in 'namespace', whose path matches
+        # the glob 'pattern' (e.g. "course-*/exercise?") and which are in
+        # the list 'repopaths', every criterion which is 'None' holds
+        if repopaths is not None and namespace is None and pattern is None :
+            return list( repopaths )
+        
+        selected = None
+        if repopaths is not None :
+            selected = set( repopaths )
+        
+        result = []
+        for r in self.getRepos( cache ) :
+            path = r['path_with_namespace']
+            if namespace is not None and path.rpartition( "/" )[ 0 ] != namespace :
+                continue
+            if pattern is not None and not fnmatch.fnmatchcase( path, pattern ) :
+                continue
+            if selected is not None and not ( path in selected ) :
+                continue
+            result.append( path )
+        return result
+    # end def
+    
+    def applyRepos( self, operation, repos, *args, **kwargs ) :
+        # calls the repo method 'operation' (e.g. "modBranch") for all
+        # 'repos' (a list of repo paths or a dict with the arguments of
+        # 'selectRepos') concurrently with the arguments after the repo
+        # path, the repos (and groups) are looked up once for all calls, a
+        # branch of a repo whose branch list is not cached is not probed
+        # (see 'addBranch' and 'modBranch'),
+        # returns the outcome of every repo as dict with the keys "repo",
+        # "outcome" ("done" or "failed"), "result" and "error"
+        assert not operation.startswith( "_" ), "invalid argument for 'operation' parameter!"
+        function = getattr( self, operation, None )
+        assert callable( function ), "method '%s' does not exist!" % operation
+        
+        cache = kwargs.pop( "cache", True )
+        if isinstance( repos, dict ) :
+            repos = self.selectRepos( cache = cache, **repos )
+        repopaths = list( repos )
+        
+        if self._lazy and self._repos is None and cache is True :
+            self._parallel( self.getRepo, repopaths )
+        else :
+            self.getRepos( cache )
+        if operation == "addGroup" :
+            self.getGroups( cache )
+        if cache is False :
+            for r in repopaths :
+                repo = self.getRepo( r )
+                if repo is not None :
+                    with self._lock :
+                        self._branches.pop( repo['id'], None )
+        
+        def call( repopath ) :
+            outcome = { "repo" : repopath, "outcome" : "done", "result" : None, "error" : None }
+            try :
+                outcome[ "result" ] = function( repopath, *args, **kwargs )
+                if outcome[ "result" ] is False :
+                    outcome.update( outcome = "failed", error = "request failed" )
+            except Exception, e :
+                outcome.update( outcome = "failed", error = str( e ) )
+            return outcome
+        
+        with self._bulk() :
+            return self._parallel( call, repopaths )
+    # end def
+    
+    def addBranches( self, repos, new_branch, old_branch, cache = True ) :
+        return self.applyRepos( "addBranch", repos, new_branch, old_branch, cache = cache )
+    # end def
+    
+    def modBranches( self, repos, branch, protect, cache = True ) :
+        return self.applyRepos( "modBranch", repos, branch, protect, cache = cache )
+    # end def
+    
+    def addGroups( self, repos, groupname, access_level = None, cache = True ) :
+        return self.applyRepos( "addGroup", repos, groupname, access_level, cache = cache )
+    # end def
+    
+    def addMilestones( self, repos, title, description, deadline, cache = True ) :
+        return self.applyRepos( "addMilestone", repos, title, description, deadline, cache = cache )
+    # end def
+    
+    ############################################################################
+    # HOOKS
+    ############################################################################
+    
+    # access levels of the hook events, which are names like "Master" (or
+    # "Maintainer", as GitLab 11 renamed this level)
+    _hook_levels = dict( _access_levels, maintainer = 40, owner = 50 )
+    
+    def serveHooks( self, port = 0, host = "127.0.0.1", token = None ) :
+        # starts a receiver of system hook events in a background thread,
+        # every event (see 'applyHook') posted to it updates the caches, with
+        # 'token' set only events with a matching 'X-Gitlab-Token' header
+        # are accepted, returns the server ('server_address' tells the bound
+        # port and 'shutdown' stops it)
+        server = _hook_server( ( host, port ), _hook_handler )
+        server.git   = self
+        server.token = token
+        
+        thread = threading.Thread( target = server.serve_forever )
+        thread.daemon = True
+        thread.start()
+        return server
+    # end def
+    
+    def applyHook( self, event ) :
+        # applies a system hook event to the caches, the events are built
+        # from the payload only (no requests), returns whether the event was
+        # one which changes the caches (e.g. not a 'push' or 'key_create')
+        name = event.get( "event_name" )
+        
+        with self._lock :
+            if name == "user_create" :
+                self._hook_user( event )
+            elif name == "user_destroy" :
+                self._hook_drop_user( event['user_id'] )
+            elif name == "user_rename" :
+                self._hook_rename_user( event )
+            elif name in ( "project_create", "project_rename", "project_transfer", "project_update" ) :
+                self._hook_repo( event )
+            elif name == "project_destroy" :
+                self._hook_drop_repo( event['project_id'], event['path_with_namespace'] )
+            elif name in ( "user_add_to_team", "user_update_for_team" ) :
+                self._hook_member( event['project_id'], event['user_id'], event )
+            elif name == "user_remove_from_team" :
+                self._hook_member( event['project_id'], event['user_id'] )
+            elif name == "group_create" :
+                self._hook_group( event )
+            elif name == "group_rename" :
+                self._hook_rename_group( event )
+            elif name == "group_destroy" :
+                self._hook_drop_group( event['group_id'], event['path'] )
+            else :
+                return False
+        return True
+    # end def
+    
+    def _hook_user( self, event ) :
+        user = \
+        { "id"         : event['user_id']
+        , "username"   : event['username']
+        , "email"      : event['email']
+        , "name"       : event['name']
+        , "state"      : "active"
+        , "created_at" : event.get( 'created_at' )
+        }
+        if self._users is not None :
+            self._merge( "_users", [ user ], self._users, self._id2user )
+        elif not ( user['id'] in self._id2user ) :
+            self._id2user[ user['id'] ] = self._compact( "_users", [ user ] )[ 0 ]
+        self._index_user( self._id2user[ user['id'] ] )
+        self._user_searches = {}
+        
+        # the id of the new user namespace is not part of the event, so the
+        # namespaces are listed again on their next use
+        self._namespaces = None
+        self.dropSnapshot( "_users" )
+    # end def
+    
+    def _unindex_user( self, user ) :
+        if self._username2user.get( user['username'] ) is user :
+            del self._username2user[ user['username'] ]
+        if self._email2user.get( user['email'] ) is user :
+            del self._email2user[ user['email'] ]
+        for key in ( user['username'], user['email'] ) :
+            for ngram in self._ngrams( key ) :
+                self._ngram2users.get( ngram, set() ).discard( user['id'] )
+    # end def
+    
+    def _hook_rename_user( self, event ) :
+        # a renamed user keeps all other fields, the user namespace and the
+        # paths of its repos are renamed with it
+        user = self._id2user.get( event['user_id'] )
+        if user is not None :
+            self._unindex_user( user )
+            entry = dict( ( k, user[ k ] ) for k in user.keys() )
+            entry.update( username = event['username'], email = event['email'], name = event['name'] )
+            user.clear()
+            user.update( entry )
+            self._index_user( user )
+        self._user_searches = {}
+        
+        self._hook_move_namespace( event['old_username'], event['username'] )
+        self._namespaces = None
+        self.dropSnapshot( "_users" )
+    # end def
+    
+    def _hook_drop_user( self, uid ) :
+        user = self._id2user.pop( uid, None )
+        if user is not None :
+            if self._users is not None :
+                self._users[:] = [ u for u in self._users if u['id'] != uid ]
+            self._unindex_user( user )
+        self._user_searches = {}
+        
+        for rid in self._user2access.pop( uid, {} ).keys() :
+            self._repo2access.get( rid, {} ).pop( uid, None )
+        
+        self._namespaces = None
+        self.dropSnapshot( "_users" )
+    # end def
+    
+    def _hook_repo( self, event ) :
+        namespace = event['path_with_namespace'].rpartition( "/" )[ 0 ]
+        known = self._path2namespace.get( namespace ) or {}
+        
+        repo = \
+        { "id"                  : event['project_id']
+        , "name"                : event['name']
+        , "path"                : event['path']
+        , "path_with_namespace" : event['path_with_namespace']
+        , "public"              : event.get( 'project_visibility' ) == "public"
+        , "namespace"           : { "id" : known.get( 'id' ), "path" : namespace, "owner_id" : known.get( 'owner_id' ) }
+        }
+        
+        current = self._id2repo.get( repo['id'] )
+        if current is not None :
+            # a renamed or transferred repo keeps all other fields
+            entry = dict( ( k, current[ k ] ) for k in current.keys() )
+            entry.update( repo )
+            repo = entry
+            if self._path2repo.get( current['path_with_namespace'] ) is current :
+                del self._path2repo[ current['path_with_namespace'] ]
         else :
-            params['wiki_enabled'] = "false"
-
-        if builds :
-            params['builds_enabled'] = "true"
+            # a new repo is empty, so it has no default branch yet
+            repo['default_branch']   = None
+            repo['description']      = ""
+            repo['last_activity_at'] = event.get( 'created_at' )
+        
+        if self._repos is not None :
+            self._merge( "_repos", [ repo ], self._repos, self._id2repo )
+        elif current is not None :
+            current.clear()
+            current.update( repo )
         else :
-            params['builds_enabled'] = "false"
+            self._id2repo[ repo['id'] ] = self._compact( "_repos", [ repo ] )[ 0 ]
+        self._index_repo( self._id2repo[ repo['id'] ] )
         
-        result = self._git.createproject( name, **params )
+        self.dropSnapshot( "_repos" )
+    # end def
+    
+    def _hook_drop_repo( self, rid, repopath ) :
+        repo = self._id2repo.pop( rid, None )
+        if repo is not None and self._repos is not None :
+            self._repos[:] = [ r for r in self._repos if r['id'] != rid ]
+        if repo is not None and self._path2repo.get( repo['path_with_namespace'] ) is repo :
+            del self._path2repo[ repo['path_with_namespace'] ]
+        if self._path2repo.get( repopath ) is repo :
+            self._path2repo.pop( repopath, None )
         
-        if isinstance( result, dict ) :
-            print "gilapt: internal: repo added", result['id'], result['path_with_namespace']
-            self._repos.append( result )
-            self._id2repo[ result['id'] ] = result
+        self._branches.pop( rid, None )
+        self._members.pop( rid, None )
+        for uid in self._repo2access.pop( rid, {} ).keys() :
+            self._user2access.get( uid, {} ).pop( rid, None )
         
-        return result
+        self.dropSnapshot( "_repos" )
     # end def
     
-    def dumpRepos( self, search = "", cache = True, stream = sys.stdout, seperator = ", ", startOfLine = "", endOfLine = "\n" ) :
-        repos = self.getRepos( cache )
+    def _hook_member( self, rid, uid, event = None ) :
+        # only repos whose members are known are updated, the others are
+        # fetched as usual on their first use
+        if not ( rid in self._repo2access ) :
+            return
         
-        result = []
-        if len( search ) == 0 :
-            result = repos
+        if event is None :
+            self._drop_access( rid, uid )
         else :
-            for r in repos :
-                if search in r[ "path_with_namespace" ] :
-                    result.append( r )
-
-        result = []
-        result.append
-        ( { 'id': "ID"
-          , 'path_with_namespace' : "Repository Path"
-          , 'description' : "Description"
-          , 'public' : "Public"
-          , 'namespace' : { 'owner_id' : None }
-          }
-        )
+            self._set_access( rid, uid, self._hook_levels[ event['access_level'].lower() ] )
+    # end def
+    
+    def _hook_group( self, event ) :
+        group = { "id" : event['group_id'], "name" : event['name'], "path" : event['path'], "description" : "" }
+        if self._groups is not None :
+            self._groups[:] = [ g for g in self._groups if g['id'] != group['id'] ] + [ group ]
+        self._id2group[ group['id'] ] = group
+        self._path2group[ group['path'] ] = group
         
-        for r in self.getRepos( cache ) :
-            if len( search ) == 0 or search in r['path_with_namespace'] :
-                result.append( r )
+        # the namespace of a group has the id of the group
+        namespace = { "id" : group['id'], "path" : group['path'], "kind" : "group", "owner_id" : None }
+        if self._namespaces is not None :
+            self._namespaces.append( namespace )
+        self._id2namespace[ namespace['id'] ] = namespace
+        self._path2namespace[ namespace['path'] ] = namespace
+    # end def
+    
+    def _hook_rename_group( self, event ) :
+        gid = event['group_id']
         
-        for r in result :
-            if r['namespace']['owner_id'] is None :
-                owner = "Owner"
-            else :
-                owner = self._get_user_by_id( r['namespace']['owner_id'] )[ 'username' ]
+        group = self._id2group.get( gid )
+        if group is not None :
+            if self._path2group.get( group['path'] ) is group :
+                del self._path2group[ group['path'] ]
+            group.update( name = event['name'], path = event['path'] )
+            self._path2group[ group['path'] ] = group
+        
+        namespace = self._id2namespace.get( gid )
+        if namespace is not None :
+            if self._path2namespace.get( namespace['path'] ) is namespace :
+                del self._path2namespace[ namespace['path'] ]
+            namespace['path'] = event['path']
+            self._path2namespace[ namespace['path'] ] = namespace
+        
+        self._hook_move_namespace \
+        ( event.get( 'old_full_path' ) or event['old_path']
+        , event.get( 'full_path' ) or event['path']
+        )
+    # end def
+    
+    def _hook_move_namespace( self, old, new ) :
+        # the cached repos in the namespace 'old' (and in its subgroups) are
+        # moved to 'new', their other fields stay as they are
+        moved = False
+        for repo in self._id2repo.values() :
+            path = repo['path_with_namespace']
+            if not path.startswith( old + "/" ) :
+                continue
             
-            stream.write( "%s%s%s%s%s%s%s%s%s%s%s" % \
-            ( startOfLine, r['id']
-            , seperator,   r['path_with_namespace']
-            , seperator,   r['description']
-            , seperator,   r['public']
-            , seperator,   owner
-            , endOfLine
-            ))
+            entry = dict( ( k, repo[ k ] ) for k in repo.keys() )
+            entry['path_with_namespace'] = new + path[ len( old ) : ]
+            entry['namespace'] = dict( repo['namespace'] )
+            if entry['namespace'].get( 'path' ) == old :
+                entry['namespace']['path'] = new
+            repo.clear()
+            repo.update( entry )
+            
+            if self._path2repo.get( path ) is repo :
+                del self._path2repo[ path ]
+            self._index_repo( repo )
+            moved = True
+        
+        if moved :
+            self.dropSnapshot( "_repos" )
     # end def
     
+    def _hook_drop_group( self, gid, path ) :
+        if self._groups is not None :
+            self._groups[:] = [ g for g in self._groups if g['id'] != gid ]
+        self._id2group.pop( gid, None )
+        self._path2group.pop( path, None )
+        
+        if self._namespaces is not None :
+            self._namespaces[:] = [ ns for ns in self._namespaces if ns['id'] != gid ]
+        self._id2namespace.pop( gid, None )
+        self._path2namespace.pop( path, None )
+    # end def
     
     ############################################################################
-    # BRANCHES
+    # DAEMON
     ############################################################################
-
-    def getBranch( self, repopath, branch, cache = True ) :
-        uid = self.getRepoID( repopath, cache )
     
-        result = self._git.getbranch( uid, branch )
-        if isinstance( result, dict ) :
-            return result
-        else :
-            return None
+    def serveSocket( self, path ) :
+        # serves the public methods of this object to clients (see
+        # 'gilaptc.py') on the Unix socket 'path' in a background thread, all
+        # clients share the caches, the session pool and the scheduler of
+        # this object, returns the server ('shutdown' stops it and
+        # 'server_close' removes the socket)
+        if os.path.exists( path ) :
+            probe = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+            try :
+                probe.connect( path )
+            except socket.error :
+                os.unlink( path )
+            else :
+                probe.close()
+                assert False, "socket '%s' is in use!" % path
+        
+        # only the owner may connect, a client acts with the token of this
+        # object
+        umask = os.umask( 0o077 )
+        try :
+            server = _socket_server( path, _socket_handler )
+        finally :
+            os.umask( umask )
+        server.git = self
+        
+        thread = threading.Thread( target = server.serve_forever )
+        thread.daemon = True
+        thread.start()
+        return server
     # end def
     
-    def hasBranch( self, repopath, branch, cache = True ) :
-        result = self.getBranch( repopath, branch, cache )
+    def _serve_call( self, method, args, kwargs ) :
+        # calls the public method 'method' for a client, the output of a
+        # 'dump' method is returned instead of written
+        assert isinstance( method, basestring ) and not method.startswith( "_" ) and not method.startswith( "serve" ) \
+        , "method '%s' is not served!" % method
+        function = getattr( self, method, None )
+        assert callable( function ), "method '%s' does not exist!" % method
         
-        if result is None :
-            return False
-        else :
-            return True
+        if method.startswith( "dump" ) :
+            stream = StringIO.StringIO()
+            function( *args, stream = stream, **kwargs )
+            return stream.getvalue()
+        return function( *args, **kwargs )
     # end def
     
-    def addBranch( self, repopath, new_branch, old_branch, cache = True ) :
-        if self.hasBranch( repopath, new_branch, cache ) :
-            assert False, "repo 'new_branch' already exists!"
-        if not self.hasBranch( repopath, old_branch, cache ) :
-            assert False, "repo 'old_branch' does not exist!"
-        
-        uid = self.getRepoID( repopath, cache )
-        
-        self._git.createbranch( uid, new_branch, old_branch )
+    
+# end class
+
+
+class gilaptTimeout(Exception):
+    """Raised if the result of a '_future' is not available in time"""
+    
+# end class
+
+
+class _future(object):
+    """Result of an asynchronously executed call"""
+    
+    def __init__( self ) :
+        self._event     = threading.Event()
+        self._lock      = threading.Lock()
+        self._result    = None
+        self._error     = None
+        self._callbacks = []
     # end def
     
-    def modBranch( self, repopath, branch, protect, cache = True ) :
-        if not self.hasBranch( repopath, branch, cache ) :
-            assert False, "repo branch does not exist!"
+    def _set( self, result, error = None ) :
+        with self._lock :
+            self._result = result
+            self._error  = error
+            self._event.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks :
+            callback( self )
+    # end def
+    
+    def done( self ) :
+        return self._event.is_set()
+    # end def
+    
+    def result( self, timeout = None ) :
+        if not self._event.wait( timeout ) :
+            raise gilaptTimeout( "future timed out!" )
+        if self._error is not None :
+            raise self._error[ 0 ], self._error[ 1 ], self._error[ 2 ]
+        return self._result
+    # end def
+    
+    def exception( self, timeout = None ) :
+        if not self._event.wait( timeout ) :
+            raise gilaptTimeout( "future timed out!" )
+        if self._error is not None :
+            return self._error[ 1 ]
+        return None
+    # end def
+    
+    def add_done_callback( self, callback ) :
+        with self._lock :
+            if not self._event.is_set() :
+                self._callbacks.append( callback )
+                return
+        callback( self )
+    # end def
+    
+# end class
 
-        uid = self.getRepoID( repopath, cache )
+
+class gilaptAsync(object):
+    """Non-blocking GitLab Python Tool"""
+    
+    # every public method of the wrapped 'gilapt' instance (getUsers,
+    # getRepo, addMember, addFile, getFile, modBranch, ...) is available with
+    # the same arguments, but returns a '_future' at once and runs on a pool
+    # of 'concurrency' threads, all calls share the caches, the connection
+    # pool and the rate limit of the wrapped instance
+    
+    def __init__( self, git, concurrency = 32 ) :
+        self._sync  = git
+        self._tasks = Queue.Queue()
         
-        if protect :
-            self._git.protectbranch( uid, branch )
-        else :
-            self._git.unprotectbranch( uid, branch )
+        self._threads = []
+        for c in range( concurrency ) :
+            t = threading.Thread( target = self._worker )
+            t.daemon = True
+            t.start()
+            self._threads.append( t )
     # end def
-
     
-    ############################################################################
-    # MEMBERS
-    ############################################################################
+    def _worker( self ) :
+        while True :
+            task = self._tasks.get()
+            if task is None :
+                return
+            future, function, args, kwargs = task
+            try :
+                result = function( *args, **kwargs )
+            except :
+                future._set( None, sys.exc_info() )
+            else :
+                future._set( result )
+    # end def
     
-    def getMembers( self, repopath, cache = True ) :
-        uid = self.getRepoID( repopath, cache )
-
-        if self._members is None :
-            self._members = {}
-        if not ( uid in self._members ) :
-            self._members[ uid ] = []
-        if len( self._members[ uid ] ) == 0 or cache is False :
-            self._members[ uid ] = []
-            c = 0
-            while True :
-                c = c + 1
-                result = self._git.getprojectmembers( uid, page = c, per_page = 100 )                
-                self._members[ uid ].extend( result )
-                if len( result ) < 100 :
-                    break
-        return self._members[ uid ]
+    def submit( self, function, *args, **kwargs ) :
+        future = _future()
+        self._tasks.put( ( future, function, args, kwargs ) )
+        return future
     # end def
     
-    def hasMember( self, repopath, username_or_email, cache = True ) :
-        result = self.getMembers( repopath, cache )
-        uid = self.getUserID( username_or_email, cache )
+    def __getattr__( self, name ) :
+        if name.startswith( "_" ) :
+            raise AttributeError( name )
+        function = getattr( self._sync, name )
+        if not callable( function ) :
+            raise AttributeError( name )
         
-        for r in result :
-            if r['id'] == uid :
-                return True
-        return False
+        def call( *args, **kwargs ) :
+            return self.submit( function, *args, **kwargs )
+        return call
     # end def
     
-    def addMember( self, repopath, username_or_email, access_level = None, cache = True ) :        
-        if not self.hasRepo( repopath, cache ) :
-            assert False, "repo does not exist!"        
-        if not self.hasUser( username_or_email, cache ) :
-            assert False, "user does not exist!"        
-        if self.hasMember( repopath, username_or_email, cache ) :
-            assert False, "repo 'member' already exists!"
-        allowed_rights = [ "guest", "reporter", "developer", "master" ]
-        if not ( access_level in allowed_rights ) :
-            assert False, "invalid argument for 'access_level' parameter!"
-        
-        rid = self.getRepoID( repopath, cache )
-        uid = self.getUserID( username_or_email, cache )
-        
-        return self._git.addprojectmember( rid, uid, access_level )
+    def gather( self, futures, timeout = None ) :
+        # waits at most 'timeout' seconds for all 'futures' together and
+        # raises 'gilaptTimeout' if one of them is not done by then
+        if timeout is None :
+            return [ f.result() for f in futures ]
+        deadline = time.time() + timeout
+        return [ f.result( max( 0, deadline - time.time() ) ) for f in futures ]
     # end def
     
-    def addGroup( self, repopath, groupname, access_level = None, cache = True ) :        
-        if not self.hasRepo( repopath, cache ) :
-            assert False, "repo does not exist!"        
-        if not self.hasGroup( groupname, cache ) :
-            assert False, "group does not exist!"        
-        
-        allowed_rights = \
-        { "guest" : 10
-        , "reporter" : 20
-        , "developer" : 30
-        , "master" : 40
-        }
-        
-        if not ( access_level in allowed_rights.keys() ) :
-            assert False, "invalid argument for 'access_level' parameter!"
-        
-        rid = self.getRepoID( repopath, cache )
-        gid = self.getGroupID( groupname, cache )
-
-        
-        return self._git.shareproject( rid, gid, allowed_rights[ access_level ] )
+    def close( self ) :
+        for t in self._threads :
+            self._tasks.put( None )
+        for t in self._threads :
+            t.join()
+        self._threads = []
     # end def
+    
+# end class
 
-    def modMember( self, repopath, branch, protect, cache = True ) :
-        # if not self.hasBranch( repopath, branch, cache ) :
-        #     assert False, "repo branch does not exist!"
+################################################################################
+# DAEMON
+################################################################################
 
-        # uid = self.getRepoID( repopath, cache )
-        
-        # if protect :
-        #     git.protectbranch( uid, branch )
-        # else :
-        #     git.unprotectbranch( uid, branch )
+def _serve_main( argv ) :
+    import signal
+    import argparse
+    
+    parser = argparse.ArgumentParser \
+    ( prog = "gilapt serve"
+    , description = "keeps one warm gilapt and serves it to 'gilaptc.py' clients on a Unix socket"
+    )
+    parser.add_argument( "host" )
+    parser.add_argument( "token" )
+    parser.add_argument( "--socket", default = os.environ.get( "GILAPT_SOCKET", os.path.expanduser( "~/.gilapt.sock" ) )
+                       , help = "path of the socket (default: $GILAPT_SOCKET or ~/.gilapt.sock)" )
+    parser.add_argument( "--workers", type = int, default = 8, help = "concurrent requests (default: 8)" )
+    parser.add_argument( "--snapshot", help = "snapshot file of the cached lists, saved on exit" )
+    parser.add_argument( "--lazy", action = "store_true", help = "do not fetch the complete lists on start" )
+    parser.add_argument( "--hooks", type = int, help = "also receive system hook events on this port" )
+    parser.add_argument( "--hook-token", help = "secret token of the system hook" )
+    parser.add_argument( "--instrument", action = "store_true", help = "count requests for 'getMetrics' and 'dumpMetrics'" )
+    parser.add_argument( "--insecure", action = "store_true", help = "do not verify the SSL certificate" )
+    args = parser.parse_args( argv )
+    
+    git = gilapt( args.host, args.token, verify_ssl = not args.insecure, workers = args.workers, snapshot = args.snapshot
+               , lazy = args.lazy, instrument = args.instrument )
+    if not args.lazy :
+        git.sync()
+    
+    servers = [ git.serveSocket( args.socket ) ]
+    if args.hooks is not None :
+        servers.append( git.serveHooks( args.hooks, token = args.hook_token ) )
+    sys.stderr.write( "gilapt: serving on '%s'\n" % args.socket )
+    
+    signal.signal( signal.SIGTERM, lambda number, frame : sys.exit( 0 ) )
+    try :
+        while True :
+            time.sleep( 3600 )
+    except KeyboardInterrupt :
         pass
-    # end def
+    finally :
+        for server in servers :
+            server.shutdown()
+            server.server_close()
+        if args.snapshot is not None :
+            git.saveSnapshot()
+    return 0
+# end def
 
-        
+
+################################################################################
+# USER IMPORT
+################################################################################
+
+def _credentials( path ) :
+    # opens the file the generated passwords are appended to, only its
+    # owner can read it
+    fd = os.open( path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0600 )
+    os.fchmod( fd, 0600 )
+    return os.fdopen( fd, "a" )
+# end def
+
+def _import_main( argv ) :
+    import argparse
     
-    ############################################################################
-    # MILESTONES
-    ############################################################################
+    parser = argparse.ArgumentParser \
+    ( prog = "gilapt import-users"
+    , description = "creates the users of a CSV file whose column titles are the arguments of 'addUser'"
+    )
+    parser.add_argument( "host" )
+    parser.add_argument( "token" )
+    parser.add_argument( "csvfile" )
+    parser.add_argument( "--journal", help = "checkpoint journal of the done rows (default: CSVFILE.journal)" )
+    parser.add_argument( "--batch", type = int, default = 500, help = "rows per batch (default: 500)" )
+    parser.add_argument( "--workers", type = int, default = 8, help = "concurrent requests (default: 8)" )
+    parser.add_argument( "--snapshot", help = "snapshot file of the cached lists" )
+    parser.add_argument( "--credentials", help = "file (mode 0600) the generated passwords of rows without one are appended to as 'username,email,password'" )
+    parser.add_argument( "--dry-run", action = "store_true", help = "only report the planned users" )
+    parser.add_argument( "--insecure", action = "store_true", help = "do not verify the SSL certificate" )
+    args = parser.parse_args( argv )
+    
+    git = gilapt( args.host, args.token, verify_ssl = not args.insecure, workers = args.workers, snapshot = args.snapshot )
+    
+    credentials = None
+    if args.credentials is not None and not args.dry_run :
+        credentials = _credentials( args.credentials )
+    
+    start = time.time()
+    try :
+        outcomes = git.importUsers( args.csvfile, args.journal or "%s.journal" % args.csvfile, args.batch, args.dry_run, credentials )
+    finally :
+        if credentials is not None :
+            credentials.close()
+    
+    counts = {}
+    for o in outcomes :
+        counts[ o[ "outcome" ] ] = counts.get( o[ "outcome" ], 0 ) + 1
+        if o[ "outcome" ] == "failed" :
+            sys.stderr.write( "gilapt: error: row %d: %s\n" % ( o[ "row" ], o[ "error" ] ) )
+    
+    sys.stderr.write \
+    ( "gilapt: %d rows, %s, %.1f rows/s\n"
+    % ( len( outcomes )
+      , ", ".join( "%d %s" % ( counts[ k ], k ) for k in sorted( counts ) )
+      , len( outcomes ) / max( time.time() - start, 0.001 )
+      )
+    )
+    
+    if args.snapshot is not None and not args.dry_run :
+        git.saveSnapshot()
+    
+    if counts.get( "failed", 0 ) > 0 :
+        return 1
+    return 0
+# end def
 
-    ## TODO: FIXME: PPA: this needs more attention!!!
-    def addMilestone( self, repopath, title, description, deadline, cache = True ) :
-        repo = self.getRepo( repopath, cache )
-        uid = repo['id']
-        
-        result = self._git.createmilestone( uid, title, description = description, due_date = deadline )
-        #print result
-        #if result != True :
-        #sys.stderr.write( "gilapt: error: unable to add file '%s' at repo '%s' @ '%s'\n" % ( filepath, repopath, branch ) )
-        return result
-    # end def
+
+################################################################################
+# ORG TABLE PROVISIONING
+################################################################################
+
+# column title (lower case) -> row key
+_org_columns = \
+{ "username"     : "username"
+, "user"         : "username"
+, "login"        : "username"
+, "email"        : "email"
+, "mail"         : "email"
+, "name"         : "fullname"
+, "fullname"     : "fullname"
+, "password"     : "password"
+, "repo"         : "repo"
+, "repository"   : "repo"
+, "project"      : "repo"
+, "description"  : "description"
+, "access"       : "access"
+, "access_level" : "access"
+, "role"         : "access"
+, "file"         : "file"
+, "path"         : "path"
+, "branch"       : "branch"
+}
+
+def _org_rows( table ) :
+    # returns the column titles and the rows (lists of cells) of an Org
+    # table, its first row holds the titles and separator rows are skipped
+    rows = []
+    for row in table :
+        cells = [ ( "%s" % c ).strip() for c in row ]
+        if len( cells ) == 0 or all( len( c ) > 0 and set( c ) <= set( "-+|" ) for c in cells ) :
+            continue
+        rows.append( cells )
     
-    ############################################################################
-    # FILES
-    ############################################################################
+    assert len( rows ) > 0, "table has no title row!"
+    return [ t.lower() for t in rows[ 0 ] ], rows[ 1: ]
+# end def
 
-    def getFile( self, repopath, branch, filepath, cache = True ) :
-        repo = self.getRepo( repopath, cache )
-        uid = repo['id']
+def _org_journal( path ) :
+    # returns the rows which are already done, the journal holds the digest
+    # of one row (without its password, see '_org_key') per line and is
+    # only ever appended
+    done = set()
+    if os.path.exists( path ) :
+        with open( path ) as journal :
+            for line in journal :
+                done.add( line.rstrip( "\n" ) )
+    return done
+# end def
+
+def _org_key( titles, cells ) :
+    # the journal key of a row, the password cell is left out, so the
+    # journal tells nothing about it
+    kept = [ c for t, c in zip( titles, cells ) if _org_columns.get( t ) != "password" ]
+    return hashlib.sha1( json.dumps( kept ) ).hexdigest()
+# end def
+
+def _org_batch( git, rows, directory, message, dry_run, credentials = None ) :
+    # provisions a batch of rows (dicts keyed by '_org_columns') through one
+    # plan and one commit per repo and branch, returns the error of every
+    # row which failed by its index, a new user without a password gets a
+    # random one, which is written to 'credentials' once the user exists
+    errors    = {}
+    users     = {}
+    generated = {}
+    repos     = {}
+    members   = {}
+    commits   = {}
+    
+    # a user exists only if the username or the email of the row is exactly
+    # taken, an existing account found by its email is used by its username
+    if any( row.get( "username" ) for row in rows ) :
+        git.getUsers()
+    
+    for i, row in enumerate( rows ) :
+        username = row.get( "username" )
+        repopath = row.get( "repo" )
         
-        if repo['default_branch'] is not None :
-            if not self.hasBranch( repopath, branch, cache ) :
-                assert False, "repo branch does not exist!"
+        if username :
+            known = git._username2user.get( username ) or git._email2user.get( row.get( "email" ) )
+            if known is not None :
+                username = known['username']
+            elif not ( username in users ) :
+                if not row.get( "email" ) :
+                    errors[ i ] = "user '%s' does not exist and has no email" % username
+                    continue
+                password = row.get( "password" )
+                if not password :
+                    if credentials is None :
+                        errors[ i ] = "user '%s' has no password and no credentials file is given" % username
+                        continue
+                    password = generated[ username ] = os.urandom( 12 ).encode( "hex" )
+                users[ username ] = \
+                { "fullname" : row.get( "fullname" ) or username
+                , "username" : username
+                , "password" : password
+                , "email"    : row.get( "email" )
+                }
         
-        result = self._git.getfile( uid, filepath, branch )
-        if isinstance( result, dict ) :
-            return result
-        else :
-            return None
-    # end def
-
-    def hasFile( self, repopath, branch, filepath, cache = True ) :
-        result = self.getFile( repopath, branch, filepath, cache )
+        if not repopath :
+            continue
         
-        if result is None :
+        namespace, separator, name = repopath.rpartition( "/" )
+        if len( namespace ) == 0 :
+            errors[ i ] = "repo '%s' has no namespace" % repopath
+            continue
+        
+        access_level = row.get( "access" ) or "developer"
+        if username and not ( access_level in git._access_levels ) :
+            errors[ i ] = "invalid access level '%s'" % access_level
+            continue
+        
+        action = None
+        if row.get( "file" ) :
+            try :
+                with open( os.path.join( directory, row[ "file" ] ), "rb" ) as f :
+                    content = f.read()
+            except IOError, e :
+                errors[ i ] = "unable to read file '%s': %s" % ( row[ "file" ], e.strerror )
+                continue
+            action = \
+            { "action"    : "update"
+            , "file_path" : row.get( "path" ) or os.path.basename( row[ "file" ] )
+            , "content"   : content.encode( "base64" )
+            , "encoding"  : "base64"
+            }
+        
+        repos.setdefault( repopath, { "namespace" : namespace, "name" : name, "path" : name, "description" : row.get( "description", "" ) } )
+        if username :
+            members.setdefault( repopath, {} )[ username ] = access_level
+        if action is not None :
+            commits.setdefault( ( repopath, row.get( "branch" ) or "master" ), [] ).append( action )
+    
+    valid = [ i for i in range( len( rows ) ) if not ( i in errors ) ]
+    
+    try :
+        plan = git.planState( { "users" : users.values(), "repos" : repos.values(), "members" : members } )
+    except AssertionError, e :
+        for i in valid :
+            errors[ i ] = "%s" % e
+        return errors
+    
+    outcome = git.applyPlan( plan, dry_run, sys.stderr )
+    for s in plan :
+        if s['action'] == "addUser" and s['target'] in generated and outcome[ s['id'] ] == "done" :
+            user = users[ s['target'] ]
+            credentials.write( "%s,%s,%s\n" % ( user['username'], user['email'], user['password'] ) )
+    if credentials is not None :
+        credentials.flush()
+    
+    failed = dict \
+    ( ( s['target'], "%s '%s' %s" % ( s['action'], s['target'], outcome[ s['id'] ] ) )
+      for s in plan if outcome[ s['id'] ] in ( "failed", "skipped" )
+    )
+    
+    if dry_run :
+        for ( repopath, branch ), actions in sorted( commits.items() ) :
+            sys.stderr.write( "#- addCommit %s @ %s (%d files)\n" % ( repopath, branch, len( actions ) ) )
+        commits = {}
+    
+    def commit( key ) :
+        repopath, branch = key
+        if repopath in failed :
+            return False
+        try :
+            return git.addCommit( repopath, branch, commits[ key ], message )
+        except AssertionError, e :
+            sys.stderr.write( "gilapt: error: commit at repo '%s' @ '%s' failed: %s\n" % ( repopath, branch, e ) )
             return False
-        else :
-            return True
-    # end def
     
-    def addFile( self, repopath, branch, filepath, data, commit_message, encoding = "text", cache = True ) :
-        repo = self.getRepo( repopath, cache )
-        uid = repo['id']
+    keys = commits.keys()
+    for ( repopath, branch ), result in zip( keys, git._parallel( commit, keys ) ) :
+        if result is not True :
+            failed.setdefault( ( repopath, branch ), "commit at repo '%s' @ '%s' failed" % ( repopath, branch ) )
+    
+    for i in valid :
+        row = rows[ i ]
+        for key in ( row.get( "username" ), row.get( "repo" ), ( row.get( "repo" ), row.get( "branch" ) or "master" ) ) :
+            if key in failed and ( key != row.get( "username" ) or key in users ) :
+                errors[ i ] = failed[ key ]
+                break
+    
+    return errors
+# end def
 
-        if repo['default_branch'] is not None :
-            if not self.hasBranch( repopath, branch, cache ) :
-                assert False, "repo branch does not exist!"
-        if self.hasFile( repopath, branch, filepath, cache ) :
-            assert False, "file already exists!"
+def main( argv ) :
+    import argparse
+    
+    if argv[ : 1 ] == [ "serve" ] :
+        return _serve_main( argv[ 1: ] )
+    if argv[ : 1 ] == [ "import-users" ] :
+        return _import_main( argv[ 1: ] )
+    
+    parser = argparse.ArgumentParser \
+    ( prog = "gilapt"
+    , description = "provisions users, repos, members and files from the first table of an Org file"
+    , epilog = "'gilapt serve --help' describes the daemon mode and 'gilapt import-users --help' the bulk user import"
+    )
+    parser.add_argument( "host" )
+    parser.add_argument( "token" )
+    parser.add_argument( "orgfile" )
+    parser.add_argument( "--journal", help = "checkpoint journal of the done rows (default: ORGFILE.journal)" )
+    parser.add_argument( "--batch", type = int, default = 500, help = "rows per batch (default: 500)" )
+    parser.add_argument( "--workers", type = int, default = 8, help = "concurrent requests (default: 8)" )
+    parser.add_argument( "--snapshot", help = "snapshot file of the cached lists" )
+    parser.add_argument( "--message", default = "gilapt: provisioned files", help = "commit message of the added files" )
+    parser.add_argument( "--credentials", help = "file (mode 0600) the generated passwords of new users without one are appended to as 'username,email,password'" )
+    parser.add_argument( "--dry-run", action = "store_true", help = "only print the planned steps" )
+    parser.add_argument( "--insecure", action = "store_true", help = "do not verify the SSL certificate" )
+    args = parser.parse_args( argv )
+    
+    git = gilapt( args.host, args.token, verify_ssl = not args.insecure, workers = args.workers, snapshot = args.snapshot )
+    org = libOrg.libOrg( args.orgfile )
+    table = org.findFirstTable()
+    
+    titles, cells = _org_rows( table )
+    journal = args.journal or "%s.journal" % args.orgfile
+    done = _org_journal( journal )
+    
+    pending = []
+    for number, c in enumerate( cells ) :
+        key = _org_key( titles, c )
+        if not ( key in done ) :
+            pending.append( ( number + 1, key, c ) )
+    
+    total   = len( cells )
+    skipped = total - len( pending )
+    ok      = 0
+    failed  = 0
+    start   = time.time()
+    
+    def progress() :
+        elapsed = max( time.time() - start, 0.001 )
+        sys.stderr.write \
+        ( "\rgilapt: %d/%d rows, %d done, %d failed, %d skipped, %.1f rows/s"
+        % ( ok + failed + skipped, total, ok, failed, skipped, ( ok + failed ) / elapsed )
+        )
+        sys.stderr.flush()
+    
+    credentials = None
+    if args.credentials is not None and not args.dry_run :
+        credentials = _credentials( args.credentials )
+    elif args.dry_run :
+        # nothing is created, but rows without a password are planned
+        credentials = open( os.devnull, "w" )
+    
+    git.getUsers()
+    progress()
+    
+    # a dry run leaves no journal behind
+    log = None
+    if not args.dry_run :
+        log = open( journal, "a" )
+    
+    for b in range( 0, len( pending ), max( 1, args.batch ) ) :
+        batch = pending[ b : b + max( 1, args.batch ) ]
+        rows = []
+        for number, key, c in batch :
+            row = {}
+            for title, cell in zip( titles, c ) :
+                if title in _org_columns and len( cell ) > 0 :
+                    row[ _org_columns[ title ] ] = cell
+            rows.append( row )
         
-        if not ( encoding in [ "text", "base64" ] ) :
-            assert False, "invalid encoding"
+        errors = _org_batch( git, rows, os.path.dirname( os.path.abspath( args.orgfile ) ), args.message, args.dry_run, credentials )
         
-        result = self._git.createfile( uid, filepath, branch, encoding, data, commit_message )
-        if result != True :
-            sys.stderr.write( "gilapt: error: unable to add file '%s' at repo '%s' @ '%s'\n" % ( filepath, repopath, branch ) )
-        return result
-    # end def
-    
-    def modFile( self, repopath, branch, filepath, data, commit_message, cache = True ) :
-        # can also be used to create files with no care if it already exists or not :)        
-        repo = self.getRepo( repopath, cache )
-        uid = repo['id']
-
-        if repo['default_branch'] is not None :
-            if not self.hasBranch( repopath, branch, cache ) :
-                assert False, "repo branch does not exist!"
+        for i, ( number, key, c ) in enumerate( batch ) :
+            if i in errors :
+                failed += 1
+                sys.stderr.write( "\ngilapt: error: row %d: %s\n" % ( number, errors[ i ] ) )
+            else :
+                ok += 1
+                if log is not None :
+                    log.write( key + "\n" )
         
-        result = self._git.updatefile( uid, filepath, branch, data, commit_message )
-        assert result == True, "internal error!"
-        return result
-    # end def
+        if log is not None :
+            log.flush()
+            os.fsync( log.fileno() )
+        progress()
     
+    sys.stderr.write( "\n" )
+    if log is not None :
+        log.close()
+    if credentials is not None :
+        credentials.close()
     
-# end class
-
-# git = gilapt( sys.argv[1], sys.argv[2] )
-# org = libOrg.libOrg( sys.argv[3] )
-# table = org.findFirstTable()
+    if args.snapshot is not None and not args.dry_run :
+        git.saveSnapshot()
+    
+    if failed > 0 :
+        return 1
+    return 0
+# end def
 
-# import pdb; pdb.set_trace()
+if __name__ == "__main__" :
+    sys.exit( main( sys.argv[ 1: ] ) )
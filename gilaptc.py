@@ -0,0 +1,130 @@
+#   
+#   Copyright (c) 2016 Philipp Paulweber
+#   All rights reserved.
+#   
+#   Developed by: Philipp Paulweber
+#                 https://github.com/ppaulweber/gilapt
+#   
+#   This file is part of gilapt.
+#   
+#   gilapt is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#   
+#   gilapt is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#   
+#   You should have received a copy of the GNU General Public License
+#   along with gilapt. If not, see <http://www.gnu.org/licenses/>.
+#   
+
+
+import os
+import re
+import sys
+import json
+import socket
+import threading
+
+
+class gilaptClient(object):
+    """Thin client of a 'gilapt.py serve' daemon"""
+    
+    def __init__( self, path = None ) :
+        if path is None :
+            path = os.environ.get( "GILAPT_SOCKET", os.path.expanduser( "~/.gilapt.sock" ) )
+        self._socket = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+        self._socket.connect( path )
+        self._reader = self._socket.makefile( "rb" )
+        self._lock   = threading.Lock()
+    # end def
+    
+    def call( self, method, *args, **kwargs ) :
+        # calls 'method' of the daemon, an assertion of the daemon is raised
+        # as such, all other errors as 'RuntimeError'
+        request = json.dumps( [ method, args, kwargs ], separators = ( ",", ":" ) )
+        with self._lock :
+            self._socket.sendall( request + "\n" )
+            line = self._reader.readline()
+        assert len( line ) > 0, "daemon closed the connection!"
+        
+        reply = json.loads( line )
+        if reply[ 0 ] :
+            return reply[ 1 ]
+        if reply[ 1 ] == "AssertionError" :
+            raise AssertionError( reply[ 2 ] )
+        raise RuntimeError( "%s: %s" % ( reply[ 1 ], reply[ 2 ] ) )
+    # end def
+    
+    def __getattr__( self, name ) :
+        # 'client.hasRepo( "group/repo" )' calls the method of the daemon
+        if name.startswith( "_" ) :
+            raise AttributeError( name )
+        return lambda *args, **kwargs : self.call( name, *args, **kwargs )
+    # end def
+    
+    def close( self ) :
+        self._reader.close()
+        self._socket.close()
+    # end def
+    
+# end class
+
+
+def main( argv ) :
+    import argparse
+    
+    parser = argparse.ArgumentParser \
+    ( prog = "gilaptc"
+    , description = "calls a method of a 'gilapt.py serve' daemon and prints its result"
+    , epilog = "every argument is passed as string (or with '--json' as JSON value), "
+               "'NAME:=JSON' passes the keyword argument NAME as JSON value "
+               "(e.g. 'gilaptc modBranch group/repo master protect:=false'), "
+               "the exit status is 1 if the result is false and 2 on errors"
+    )
+    parser.add_argument( "--socket", help = "path of the socket (default: $GILAPT_SOCKET or ~/.gilapt.sock)" )
+    parser.add_argument( "--json", action = "store_true", help = "pass every positional argument as JSON value" )
+    parser.add_argument( "method" )
+    parser.add_argument( "args", nargs = argparse.REMAINDER )
+    args = parser.parse_args( argv )
+    
+    values = []
+    keywords = {}
+    for a in args.args :
+        name, separator, value = a.partition( ":=" )
+        try :
+            if len( separator ) > 0 and re.match( r"^[A-Za-z_][A-Za-z0-9_]*$", name ) :
+                keywords[ name ] = json.loads( value )
+            elif args.json :
+                values.append( json.loads( a ) )
+            else :
+                values.append( a )
+        except ValueError :
+            sys.stderr.write( "gilaptc: error: argument '%s' is no JSON value\n" % a )
+            return 2
+    
+    try :
+        client = gilaptClient( args.socket )
+        result = client.call( args.method, *values, **keywords )
+        client.close()
+    except ( socket.error, AssertionError, RuntimeError ), e :
+        sys.stderr.write( "gilaptc: error: %s\n" % e )
+        return 2
+    
+    if isinstance( result, basestring ) :
+        sys.stdout.write( result.encode( "utf-8" ) )
+        if not result.endswith( "\n" ) :
+            sys.stdout.write( "\n" )
+    else :
+        sys.stdout.write( json.dumps( result, sort_keys = True ) + "\n" )
+    
+    if result is False :
+        return 1
+    return 0
+# end def
+
+if __name__ == "__main__" :
+    sys.exit( main( sys.argv[ 1: ] ) )
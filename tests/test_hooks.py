@@ -0,0 +1,231 @@
+#
+#   Copyright (c) 2016 Philipp Paulweber
+#   All rights reserved.
+#
+#   Developed by: Philipp Paulweber
+#                 https://github.com/ppaulweber/gilapt
+#
+#   This file is part of gilapt.
+#
+#   gilapt is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   gilapt is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with gilapt. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# applies system hook payloads as GitLab sends them (taken from the system
+# hook documentation) to the caches of a lazy instance, no request is sent
+#
+#   python -m unittest discover tests
+
+import os
+import sys
+import json
+import httplib
+import unittest
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), ".." ) )
+
+import gilapt
+
+
+_user_create = \
+{ "created_at" : "2012-07-21T07:30:54Z"
+, "updated_at" : "2012-07-21T07:38:22Z"
+, "email" : "js@gitlabhq.com"
+, "event_name" : "user_create"
+, "name" : "John Smith"
+, "username" : "js"
+, "user_id" : 41
+}
+
+_user_rename = \
+{ "event_name" : "user_rename"
+, "created_at" : "2017-11-01T11:21:04Z"
+, "updated_at" : "2017-11-01T14:04:47Z"
+, "name" : "new-name"
+, "email" : "best-email@example.tld"
+, "user_id" : 41
+, "username" : "new-exciting-name"
+, "old_username" : "js"
+}
+
+_group_create = \
+{ "created_at" : "2012-07-21T07:30:54Z"
+, "updated_at" : "2012-07-21T07:38:22Z"
+, "event_name" : "group_create"
+, "name" : "StoreCloud"
+, "owner_email" : None
+, "owner_name" : None
+, "path" : "storecloud"
+, "group_id" : 78
+}
+
+_group_rename = \
+{ "event_name" : "group_rename"
+, "created_at" : "2017-10-30T15:09:00Z"
+, "updated_at" : "2017-11-01T10:23:52Z"
+, "name" : "Better Name"
+, "path" : "better-name"
+, "full_path" : "better-name"
+, "group_id" : 78
+, "owner_name" : None
+, "owner_email" : None
+, "old_path" : "storecloud"
+, "old_full_path" : "storecloud"
+}
+
+_project_create = \
+{ "created_at" : "2012-07-21T07:30:54Z"
+, "updated_at" : "2012-07-21T07:38:22Z"
+, "event_name" : "project_create"
+, "name" : "StoreCloud"
+, "owner_email" : "johnsmith@gmail.com"
+, "owner_name" : "John Smith"
+, "path" : "storecloud"
+, "path_with_namespace" : "storecloud/storecloud"
+, "project_id" : 74
+, "project_visibility" : "private"
+}
+
+_project_update = \
+{ "created_at" : "2012-07-21T07:30:54Z"
+, "updated_at" : "2012-07-21T07:38:22Z"
+, "event_name" : "project_update"
+, "name" : "StoreCloud"
+, "owner_email" : "johnsmith@gmail.com"
+, "owner_name" : "John Smith"
+, "path" : "storecloud"
+, "path_with_namespace" : "storecloud/storecloud"
+, "project_id" : 74
+, "project_visibility" : "public"
+}
+
+_user_add_to_team = \
+{ "created_at" : "2012-07-21T07:30:56Z"
+, "updated_at" : "2012-07-21T07:38:22Z"
+, "event_name" : "user_add_to_team"
+, "access_level" : "Maintainer"
+, "project_id" : 74
+, "project_name" : "StoreCloud"
+, "project_path" : "storecloud"
+, "project_path_with_namespace" : "storecloud/storecloud"
+, "user_email" : "johnsmith@gmail.com"
+, "user_name" : "John Smith"
+, "user_username" : "johnsmith"
+, "user_id" : 41
+, "project_visibility" : "private"
+}
+
+_user_update_for_team = \
+{ "created_at" : "2012-07-21T07:30:56Z"
+, "updated_at" : "2012-07-21T07:38:22Z"
+, "event_name" : "user_update_for_team"
+, "access_level" : "Developer"
+, "project_id" : 74
+, "project_name" : "StoreCloud"
+, "project_path" : "storecloud"
+, "project_path_with_namespace" : "storecloud/storecloud"
+, "user_email" : "johnsmith@gmail.com"
+, "user_name" : "John Smith"
+, "user_username" : "johnsmith"
+, "user_id" : 41
+, "project_visibility" : "private"
+}
+
+_key_create = \
+{ "event_name" : "key_create"
+, "created_at" : "2014-08-18 18:45:16 UTC"
+, "updated_at" : "2012-07-21T07:38:22Z"
+, "username" : "root"
+, "key" : "ssh-rsa AAAAB3NzaC1yc2EAAAADAQABAAABAQC58FwqHUbebw2SdT7SP4FxZ0w+lAO/erhy2ylhlcW/tZ3GY3mBu9VeeiSGoGz8hCx80Zrz+aQv28xfFfKlC8XQFpCWwsnWnQqO2Lv9bS8V1fIHgMxOHIt5Vs+9CAWGCCvUOAurjsUDoE2ALIXLDMKnJxcxD13XjWdK54j6ZXDB4syLF0C2PnAQSVY9X7MfCYwtuFmhQhKaBussAXpaVMRHltie3UYSBUUuZaB3J4cg/7TxlmxcNd+ppPRIpSZAB0NI6aOnqoBCpimscO/VpQRJMVLr3XiSYeT6HBiDXWHnIVPfQc03OGcaFqOit6p8lYKMaP/iUQLm+pgpZqrXZ9vB john@localhost"
+, "id" : 4
+}
+
+
+class hookTest(unittest.TestCase):
+
+    def setUp( self ) :
+        # nothing listens on the port, so every request would fail
+        self.git = gilapt.gilapt( "http://127.0.0.1:9", lazy = True, retries = 0 )
+        for event in ( _user_create, _group_create, _project_create ) :
+            self.assertTrue( self.git.applyHook( dict( event ) ) )
+        self.git._repo2access[ 74 ] = {}
+    # end def
+
+    def test_create( self ) :
+        self.assertEqual( self.git.getUser( "js" )['id'], 41 )
+        self.assertEqual( self.git.getGroup( "storecloud" )['id'], 78 )
+        self.assertEqual( self.git.getRepo( "storecloud/storecloud" )['id'], 74 )
+    # end def
+
+    def test_user_rename( self ) :
+        self.assertTrue( self.git.applyHook( _user_rename ) )
+
+        self.assertEqual( self.git.getUser( "new-exciting-name" )['id'], 41 )
+        self.assertEqual( self.git.getUser( "best-email@example.tld" )['id'], 41 )
+        self.assertFalse( "js" in self.git._username2user )
+        self.assertFalse( "js@gitlabhq.com" in self.git._email2user )
+    # end def
+
+    def test_group_rename( self ) :
+        self.assertTrue( self.git.applyHook( _group_rename ) )
+
+        self.assertEqual( self.git.getGroup( "better-name" )['name'], "Better Name" )
+        self.assertFalse( "storecloud" in self.git._path2group )
+
+        repo = self.git.getRepo( "better-name/storecloud" )
+        self.assertEqual( repo['id'], 74 )
+        self.assertEqual( repo['namespace']['path'], "better-name" )
+        self.assertFalse( "storecloud/storecloud" in self.git._path2repo )
+    # end def
+
+    def test_project_update( self ) :
+        self.assertFalse( self.git.getRepo( "storecloud/storecloud" )['public'] )
+        self.assertTrue( self.git.applyHook( _project_update ) )
+        self.assertTrue( self.git.getRepo( "storecloud/storecloud" )['public'] )
+    # end def
+
+    def test_members( self ) :
+        self.assertTrue( self.git.applyHook( _user_add_to_team ) )
+        self.assertEqual( self.git._repo2access[ 74 ], { 41 : 40 } )
+
+        self.assertTrue( self.git.applyHook( _user_update_for_team ) )
+        self.assertEqual( self.git._repo2access[ 74 ], { 41 : 30 } )
+        self.assertEqual( self.git._user2access[ 41 ], { 74 : 30 } )
+    # end def
+
+    def test_unrelated( self ) :
+        self.assertFalse( self.git.applyHook( _key_create ) )
+    # end def
+
+    def test_receiver( self ) :
+        server = self.git.serveHooks( token = "secret" )
+        try :
+            def post( event, token = "secret" ) :
+                connection = httplib.HTTPConnection( *server.server_address )
+                connection.request( "POST", "/", json.dumps( event ), { "X-Gitlab-Token" : token } )
+                return connection.getresponse().status
+
+            self.assertEqual( post( _user_add_to_team ), 200 )
+            self.assertEqual( post( _key_create ), 202 )
+            self.assertEqual( post( dict( _user_add_to_team, access_level = "Unknown" ) ), 422 )
+            self.assertEqual( post( _user_add_to_team, "wrong" ), 401 )
+        finally :
+            server.shutdown()
+            server.server_close()
+    # end def
+
+# end class
+
+
+if __name__ == "__main__" :
+    unittest.main()